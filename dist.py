@@ -8,9 +8,14 @@ import zipfile
 base_path = os.path.dirname(os.path.realpath(__file__))
 config_path = f"{base_path}/io_simgeom/__init__.py"
 
+# Files the add-on writes to its data directory at runtime, never shipped
+runtime_files = ["version_check.json", "fnv_hashmap.bin", "fnv_hashmap.journal", "fnv_hashmap.lock"]
+
 def zipdir(path, ziph):
     for root, dirs, files in os.walk(path):
         for file in files:
+            if file in runtime_files or file.endswith(".tmp"):
+                continue
             if not ".pyc" in file:
                 fullpath = os.path.join(root, file)
                 relpath = os.path.relpath(fullpath, base_path)
@@ -20,19 +20,22 @@
 
 import os
 
-import bpy
-
-from io_simgeom.io.geom_export    import SIMGEOM_OT_export_geom
-from io_simgeom.io.geom_import    import SIMGEOM_OT_import_geom
-from io_simgeom.io.morph_import   import SIMGEOM_OT_import_morph
-from io_simgeom.io.rig_import     import SIMGEOM_OT_import_rig
-from io_simgeom.ui                import SIMGEOM_PT_utility_panel
-from io_simgeom.operators         import *
+# bpy is only available inside Blender, without it only the file readers and writers
+# are usable, see io_simgeom.cli
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if bpy is not None:
+    from io_simgeom.io.geom_export    import SIMGEOM_OT_export_geom
+    from io_simgeom.io.geom_import    import SIMGEOM_OT_import_geom
+    from io_simgeom.io.morph_import   import SIMGEOM_OT_import_morph
+    from io_simgeom.io.rig_import     import SIMGEOM_OT_import_rig
+    from io_simgeom.ui                import SIMGEOM_PT_utility_panel
+    from io_simgeom.operators         import *
 from io_simgeom.util.globals      import Globals
-
-from urllib.request import urlopen, Request
-from urllib.error import URLError
-import json
+from io_simgeom.util.updater      import start_version_check
 
 bl_info = {
     "name": "Sims 3 GEOM Tools 2.0",
@@ -44,59 +47,23 @@ bl_info = {
     "description": "Importer and exporter for Sims 3 GEOM(.simgeom) files"
 }
 
-classes = [
-    SIMGEOM_PT_utility_panel,
-    SIMGEOM_OT_import_rig,
-    SIMGEOM_OT_import_geom,
-    SIMGEOM_OT_export_geom,
-    SIMGEOM_OT_import_rig_helper,
-    SIMGEOM_OT_import_morph,
-    SIMGEOM_OT_rebuild_bone_database,
-    SIMGEOM_OT_rename_bone_groups,
-    SIMGEOM_OT_reset_id_margin,
-    SIMGEOM_OT_recalc_ids,
-    SIMGEOM_OT_remove_ids,
-    SIMGEOM_OT_copy_data,
-    SIMGEOM_OT_make_morph
-]
-
-CHECK_FAILED = -1
-CHECK_UPDATED = 0
-CHECK_OUTDATED = 1
-
-
-def check_version():
-    url = "https://api.github.com/repos/SmugTomato/blender-sims3-geom/releases/latest"
-
-    http_request = Request(url, headers={"Accept": "application/json"})
-    tag = None
-
-    try:
-        with urlopen(http_request, timeout=2) as response:
-            if response.status != 200:
-                return CHECK_FAILED
-            
-            s = response.read().decode()
-            data = json.loads(s)
-            
-            tag = data.get('tag_name')
-        
-        if tag == None:
-            return CHECK_FAILED
-
-        tag = tag.replace('v', '').split('.')
-        tag = [int(i) for i in tag]
-
-        local = bl_info['version']
-
-        for i in range(3):
-            if tag[i] > local[i]:
-                return CHECK_OUTDATED
-    except URLError as err:
-        print(err)
-        return CHECK_FAILED
-    
-    return CHECK_UPDATED
+classes = []
+if bpy is not None:
+    classes = [
+        SIMGEOM_PT_utility_panel,
+        SIMGEOM_OT_import_rig,
+        SIMGEOM_OT_import_geom,
+        SIMGEOM_OT_export_geom,
+        SIMGEOM_OT_import_rig_helper,
+        SIMGEOM_OT_import_morph,
+        SIMGEOM_OT_rebuild_bone_database,
+        SIMGEOM_OT_rename_bone_groups,
+        SIMGEOM_OT_reset_id_margin,
+        SIMGEOM_OT_recalc_ids,
+        SIMGEOM_OT_remove_ids,
+        SIMGEOM_OT_copy_data,
+        SIMGEOM_OT_make_morph
+    ]
 
 
 # Only needed if you want to add into a dynamic menu
@@ -111,6 +78,9 @@ def menu_func_export(self, context):
 
 
 def register():
+    # Runs in the background, the panel shows the result once it is in
+    start_version_check(bl_info['version'])
+
     for item in classes:
         bpy.utils.register_class(item)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
@@ -158,4 +128,4 @@ if __name__ == "__main__":
     register()
 
 rootdir = os.path.dirname(os.path.realpath(__file__))
-Globals.init(rootdir, check_version())
+Globals.init(rootdir)
@@ -0,0 +1,242 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Headless GEOM and grannyrig tools, usable without Blender
+
+    python -m io_simgeom.cli info       FILE...
+    python -m io_simgeom.cli dump-json  FILE [-o OUT]
+    python -m io_simgeom.cli roundtrip  FILE...
+    python -m io_simgeom.cli convert    IN OUT
+    python -m io_simgeom.cli batch      PATTERN... [-o DIR] [-j WORKERS]
+"""
+
+import argparse
+import json
+import sys
+
+from array                      import array
+
+from io_simgeom.io.batch        import GeomBatch
+from io_simgeom.io.geom_load    import GeomLoader
+from io_simgeom.io.geom_write   import GeomWriter
+from io_simgeom.io.rig_load     import RigLoader
+from io_simgeom.models.face     import FaceBuffer
+from io_simgeom.models.geom     import Geom
+from io_simgeom.models.skeleton import Skeleton
+from io_simgeom.models.vertex   import VertexBuffer, ELEMENT_TYPES
+
+
+def geom_to_dict(geom: Geom) -> dict:
+    """JSON serializable representation of a GEOM, vertex attributes are stored as flat columns"""
+    vertices = VertexBuffer.fromVertices(geom.element_data)
+    columns = {}
+    for name, _width, _typecode in ELEMENT_TYPES.values():
+        column = getattr(vertices, name)
+        if column is None:
+            continue
+        if name == 'uv':
+            columns[name] = [layer.tolist() for layer in column]
+        else:
+            columns[name] = column.tolist()
+
+    return {
+        'internal_chunks':          geom.internal_chunks,
+        'external_resources':       geom.external_resources,
+        'embeddedID':               geom.embeddedID,
+        'merge_group':              geom.merge_group,
+        'sort_order':               geom.sort_order,
+        'skin_controller_index':    geom.skin_controller_index,
+        'shaderdata':               geom.shaderdata or [],
+        'bones':                    geom.bones,
+        'tgi_list':                 geom.tgi_list,
+        'vertex_count':             len(vertices),
+        'vertices':                 columns,
+        'faces':                    list(GeomWriter.getIndices(geom.faces))
+    }
+
+
+def geom_from_dict(data: dict) -> Geom:
+    """Inverse of geom_to_dict"""
+    geom = Geom()
+    for key in ['internal_chunks', 'external_resources', 'embeddedID', 'merge_group', 'sort_order',
+                'skin_controller_index', 'shaderdata', 'bones', 'tgi_list']:
+        setattr(geom, key, data[key])
+
+    columns = {}
+    for name, _width, typecode in ELEMENT_TYPES.values():
+        column = data['vertices'].get(name)
+        if column is None:
+            continue
+        if name == 'uv':
+            columns[name] = [array(typecode, layer) for layer in column]
+        else:
+            columns[name] = array(typecode, column)
+    geom.vertex_buffer = VertexBuffer(data['vertex_count'], columns)
+    geom.vertex_count = data['vertex_count']
+    geom.faces = FaceBuffer( array('H', data['faces']) )
+    geom.face_count = len(geom.faces)
+    return geom
+
+
+def is_rig(path: str) -> bool:
+    return path.lower().endswith('.grannyrig')
+
+
+def load_json(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_json(data: dict, path: str = None):
+    if path is None:
+        json.dump(data, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+
+def cmd_info(args) -> int:
+    for path in args.files:
+        print(path)
+        if is_rig(path):
+            skeleton = Skeleton.fromRig( RigLoader.loadRig(path) )
+            print(f"    Skeleton:       {skeleton.name}")
+            print(f"    Bones:          {len(skeleton)}")
+            print(f"    Depth:          {len(skeleton.getLevels())}")
+            print(f"    Mirror pairs:   {len(skeleton.getMirrorPairs())}")
+            continue
+
+        geom = GeomLoader.readGeomHeader(path, use_mmap=True)
+        elements = [e['name'] or hex(e['type']) for e in geom.element_layout]
+        print(f"    Shader:         {geom.embeddedID}")
+        print(f"    Merge group:    {geom.merge_group}")
+        print(f"    Sort order:     {geom.sort_order}")
+        print(f"    Vertices:       {geom.vertex_count}")
+        print(f"    Faces:          {geom.face_count}")
+        print(f"    Elements:       {', '.join(elements)}")
+        print(f"    Bones:          {len(geom.bones)}")
+        print(f"    TGIs:           {len(geom.tgi_list)}")
+    return 0
+
+
+def cmd_dump_json(args) -> int:
+    if is_rig(args.file):
+        data = RigLoader.toDict( RigLoader.loadRig(args.file) )
+    else:
+        data = geom_to_dict( GeomLoader.readGeom(args.file, use_mmap=True) )
+    write_json(data, args.output)
+    return 0
+
+
+def roundtrip(path: str) -> str:
+    """Re-encode a GEOM, 'identical' when the bytes match, 'equivalent' when only the decoded data does"""
+    with open(path, 'rb') as f:
+        original = f.read()
+    geom = GeomLoader.geomFromData(original)
+    rebuilt = GeomWriter.buildData(geom)
+    if rebuilt == original:
+        return 'identical'
+    if geom_to_dict( GeomLoader.geomFromData(rebuilt) ) == geom_to_dict(geom):
+        return 'equivalent'
+    return 'mismatch'
+
+
+def validate(geom: Geom, path: str) -> str:
+    """Batch transform, roundtrip() for a file loaded by the batch engine"""
+    return roundtrip(path)
+
+
+def cmd_roundtrip(args) -> int:
+    failed = 0
+    for path in args.files:
+        status = roundtrip(path)
+        if status == 'mismatch':
+            failed += 1
+        print(f"{status:<12}{path}")
+    return 1 if failed else 0
+
+
+def cmd_convert(args) -> int:
+    source = args.input.lower()
+    target = args.output.lower()
+    if source.endswith('.json') and target.endswith('.simgeom'):
+        GeomWriter.writeGeom(args.output, geom_from_dict( load_json(args.input) ))
+    elif source.endswith('.simgeom') and target.endswith('.json'):
+        write_json(geom_to_dict( GeomLoader.readGeom(args.input, use_mmap=True) ), args.output)
+    elif source.endswith('.simgeom') and target.endswith('.simgeom'):
+        GeomWriter.writeGeom(args.output, GeomLoader.readGeom(args.input, use_mmap=True))
+    elif is_rig(source) and target.endswith('.json'):
+        write_json(RigLoader.toDict( RigLoader.loadRig(args.input) ), args.output)
+    else:
+        print(f"Can't convert {args.input} to {args.output}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def cmd_batch(args) -> int:
+    """Re-encode every GEOM into the output directory, or validate them when there is none"""
+    transform = None if args.output else validate
+    failed = 0
+    for result in GeomBatch.run(args.patterns, transform=transform, output=args.output, workers=args.workers):
+        if result['error']:
+            failed += 1
+            print(f"{'error':<12}{result['path']}\n{result['error']}", file=sys.stderr)
+        elif args.output:
+            print(f"{'written':<12}{result['output']}")
+        else:
+            if result['result'] == 'mismatch':
+                failed += 1
+            print(f"{result['result']:<12}{result['path']}")
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m io_simgeom.cli", description="Sims 3 GEOM and grannyrig tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('info', help="Print a summary of GEOM or grannyrig files")
+    command.add_argument('files', nargs='+')
+    command.set_defaults(func=cmd_info)
+
+    command = commands.add_parser('dump-json', help="Dump a GEOM or grannyrig file as JSON")
+    command.add_argument('file')
+    command.add_argument('-o', '--output', help="Output file, stdout when omitted")
+    command.set_defaults(func=cmd_dump_json)
+
+    command = commands.add_parser('roundtrip', help="Check that GEOM files survive being decoded and re-encoded")
+    command.add_argument('files', nargs='+')
+    command.set_defaults(func=cmd_roundtrip)
+
+    command = commands.add_parser('convert', help="Convert between .simgeom and .json, or a .grannyrig to .json")
+    command.add_argument('input')
+    command.add_argument('output')
+    command.set_defaults(func=cmd_convert)
+
+    command = commands.add_parser('batch', help="Re-encode or validate many GEOM files in parallel")
+    command.add_argument('patterns', nargs='+', help="Files, directories or glob patterns")
+    command.add_argument('-o', '--output', help="Output directory, GEOMs are only validated when omitted")
+    command.add_argument('-j', '--workers', type=int, default=None, help="Worker processes, 0 to run in-process")
+    command.set_defaults(func=cmd_batch)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# Copyright (C) 2019 SmugTomato
+# 
+# This file is part of BlenderGeom.
+# 
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+import glob
+import os
+import traceback
+
+from concurrent.futures     import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing                 import Callable, Iterator, List
+
+from io_simgeom.io.geom_load    import GeomLoader
+from io_simgeom.io.geom_write   import GeomWriter
+from io_simgeom.models.geom     import Geom
+from io_simgeom.util.globals    import Globals
+
+
+class GeomBatch:
+    """
+    Runs load -> transform -> write over many GEOM files in a process pool.
+
+    transform is called as transform(geom, path) and has to be picklable, so a module level function.
+    When it returns a Geom that Geom is written to the output, anything else is returned as the result.
+    Without a transform the loaded GEOM itself is written, which makes for a round trip.
+
+    output is either a directory, files keep their names, or a picklable callable mapping input to output path.
+    Without an output nothing is written.
+    """
+
+
+    @staticmethod
+    def expandPaths(patterns) -> List[str]:
+        """Expand paths, directories and glob patterns into a list of unique GEOM paths"""
+        if isinstance(patterns, str):
+            patterns = [patterns]
+
+        paths = []
+        for pattern in patterns:
+            if glob.has_magic(pattern):
+                paths.extend( sorted(glob.glob(pattern, recursive=True)) )
+            elif os.path.isdir(pattern):
+                paths.extend( sorted(glob.glob(os.path.join(pattern, '**', '*.simgeom'), recursive=True)) )
+            else:
+                paths.append(pattern)
+
+        return list(dict.fromkeys(paths))
+    
+
+    @staticmethod
+    def run(
+        patterns,
+        transform:      Callable    = None,
+        output                      = None,
+        workers:        int         = None,
+        max_in_flight:  int         = None,
+        use_mmap:       bool        = False
+    ) -> Iterator[dict]:
+        """
+        Yield a result dict per file as they complete:
+        {'path': input path, 'output': written path or None, 'result': transform result, 'error': traceback or None}
+
+        workers defaults to the number of CPUs, 0 runs everything in the current process.
+        At most max_in_flight files, by default twice the worker count, are queued at once.
+        """
+        paths = GeomBatch.expandPaths(patterns)
+
+        if workers == 0:
+            for path in paths:
+                yield GeomBatch.processFile(path, transform, output, use_mmap)
+            return
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if max_in_flight is None:
+            max_in_flight = workers * 2
+
+        pending = iter(paths)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=GeomBatch.initWorker,
+            initargs=(Globals.ROOTDIR,)
+        ) as executor:
+            in_flight = set()
+            while True:
+                for path in pending:
+                    in_flight.add( executor.submit(GeomBatch.processFile, path, transform, output, use_mmap) )
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    
+
+    @staticmethod
+    def initWorker(rootdir: str):
+        Globals.init(rootdir)
+    
+
+    @staticmethod
+    def processFile(path: str, transform: Callable, output, use_mmap: bool = False) -> dict:
+        """Load, transform and write a single file, errors are captured in the result"""
+        result = {'path': path, 'output': None, 'result': None, 'error': None}
+        try:
+            geom = GeomLoader.readGeom(path, use_mmap=use_mmap)
+            if transform is not None:
+                value = transform(geom, path)
+                if isinstance(value, Geom):
+                    geom = value
+                else:
+                    geom = None
+                    result['result'] = value
+
+            if geom is not None and output is not None:
+                if callable(output):
+                    outpath = output(path)
+                else:
+                    outpath = os.path.join(output, os.path.basename(path))
+                directory = os.path.dirname(outpath)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                GeomWriter.writeGeom(outpath, geom)
+                result['output'] = outpath
+        except Exception:
+            result['error'] = traceback.format_exc()
+        return result
@@ -21,16 +21,21 @@ import math
 import bpy
 import bmesh
 
-from mathutils              import Vector, Quaternion
 from bpy_extras.io_utils    import ExportHelper
 from bpy.props              import StringProperty, BoolProperty, EnumProperty, IntProperty
 from bpy.types              import Operator
 
 from io_simgeom.io.geom_write   import GeomWriter
+from io_simgeom.io.morph_write  import MorphWriter
+from io_simgeom.models.face     import FaceBuffer
 from io_simgeom.models.geom     import Geom
 from io_simgeom.models.vertex   import Vertex
 from io_simgeom.util.fnv        import fnv32
 from io_simgeom.util.globals    import Globals
+from io_simgeom.util.mesh       import vertex_positions, vertex_normals
+from io_simgeom.util.mesh       import morph_shape_keys, shape_key_positions, shape_key_normals, get_shape_key_normals, shape_keys_muted
+from io_simgeom.util.tangents   import calc_tangents
+from io_simgeom.util.vertexids  import get_vertex_ids, NO_ID
 
 
 class SIMGEOM_OT_export_geom(Operator, ExportHelper):
@@ -50,7 +55,7 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
 
     do_export_morphs: BoolProperty(
         name = "Export Morphs",
-        description = "Export all morphs belonging to the selected GEOM.",
+        description = "Export all morphs belonging to the selected GEOM, linked morph objects and MORPH_ shape keys.",
         default = True
     )
 
@@ -119,14 +124,19 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
             geom_data.bones[val] = ob.vertex_groups[key].name
         
         # Set Vertex IDs
-        for key, values in ob.get('vert_ids').items():
-            for v in values:
-                g_element_data[v].vertex_id = [int(key, 0)]
+        vertex_ids = get_vertex_ids(ob)
+        if vertex_ids is not None:
+            if len(vertex_ids) != len(me.vertices) or NO_ID in vertex_ids:
+                self.report({'ERROR'}, "One or more vertices have no vertex ID, please recalculate the vertex IDs. Export cancelled!")
+                return {"CANCELLED"}
+            for element, vertex_id in zip(g_element_data, vertex_ids):
+                element.vertex_id = [vertex_id]
         
-        # Temporary mesh for export
-        depsgraph = context.evaluated_depsgraph_get()
-        obj_eval = ob.evaluated_get(depsgraph)
-        mesh_instance = obj_eval.to_mesh()
+        # Temporary mesh for export, evaluated without the shape key mix so it holds the base shape
+        with shape_keys_muted(ob):
+            depsgraph = context.evaluated_depsgraph_get()
+            obj_eval = ob.evaluated_get(depsgraph)
+            mesh_instance = obj_eval.to_mesh()
 
         # Triangulate the mesh
         bm = bmesh.new()
@@ -211,7 +221,7 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
 
         # Morphs
         if self.do_export_morphs:
-            self.export_morphs(ob, mesh_instance, normals, geom_data.faces, geom_data.bones)
+            self.export_morphs(ob, mesh_instance, geom_data.faces, geom_data.bones)
 
         ob.to_mesh_clear()
 
@@ -220,47 +230,11 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
 
     def calc_tangents(self, element_data, geom_data):
         """Calculate Tangents of the mesh to make normalmaps work"""
-        # Calculating Tangents, can be done in blender but would require trial and error to flip axis
-        # http://www.opengl-tutorial.org/intermediate-tutorials/tutorial-13-normal-mapping/
-        tangents = [[] for _ in range(len(element_data))]
-        for face in geom_data.faces:
-            # Position Shortcuts
-            v0 = Vector(element_data[face[0]].position)
-            v1 = Vector(element_data[face[1]].position)
-            v2 = Vector(element_data[face[2]].position)
-
-            # UV Shortcuts
-            uv0 = Vector(element_data[face[0]].uv[0])
-            uv1 = Vector(element_data[face[1]].uv[0])
-            uv2 = Vector(element_data[face[2]].uv[0])
-
-            # Position Delta
-            delta_pos1 = v1 - v0
-            delta_pos2 = v2 - v0
-
-            # UV Delta
-            delta_uv1 = uv1 - uv0
-            delta_uv2 = uv2 - uv0
-
-            # Tangent Calculation
-            result = ( delta_uv1.x * delta_uv2.y - delta_uv1.y * delta_uv2.x )
-            if result != 0:
-                r = 1.0 / result
-            else:
-                r= 1.0 / 0.001
-            tangent = ( delta_pos1 * delta_uv2.y - delta_pos2 * delta_uv1.y ) * r
-
-            for v in face:
-                tangents[v].append(tangent.normalized())
-
-        # Average the tangents
-        for i, v in enumerate(tangents):
-            total = Vector((0,0,0))
-            length = len(v)
-            for n in v:
-                total += n
-            average = total / length
-            element_data[i].tangent = average.normalized().to_tuple()
+        positions = [c for v in element_data for c in v.position]
+        uvs = [c for v in element_data for c in v.uv[0]]
+        tangents = calc_tangents( positions, uvs, GeomWriter.getIndices(geom_data.faces) ).tolist()
+        for i, element in enumerate(element_data):
+            element.tangent = tuple(tangents[3*i:3*i + 3])
     
 
     def get_morphs(self, base_obj):
@@ -277,12 +251,24 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
         return morphs
 
 
-    def export_morphs(self, original_object, mesh_instance, original_normals, faces, bones):
+    def export_morphs(self, original_object, mesh_instance, faces, bones):
         """Create geom files for all morphs"""
 
         vert_count = len(mesh_instance.vertices)
         mismatch_count = 0
 
+        # Everything shared by the morphs is only extracted once
+        base_positions = vertex_positions(mesh_instance)
+        base_normals = vertex_normals(mesh_instance)
+        vertex_ids = get_vertex_ids(original_object)
+        if vertex_ids is not None and len(vertex_ids) != vert_count:
+            self.report({'ERROR'}, "Vertex IDs don't match the exported vertices, please recalculate the vertex IDs. Morphs not exported!")
+            return
+        faces = FaceBuffer( GeomWriter.getIndices(faces) )
+        sort_order = original_object.get('sortorder', 0)
+        merge_group = original_object.get('mergegroup', 0)
+
+        morph_files = {}
         morphs = self.get_morphs(original_object)
         for morph_obj in morphs:
             morph_mesh = morph_obj.data
@@ -290,88 +276,43 @@ class SIMGEOM_OT_export_geom(Operator, ExportHelper):
             if vert_count != len(morph_mesh.vertices):
                 mismatch_count += 1
                 continue
-            
-            geom_data = Geom()
-            element_data = []
-            
-            # Get per vertex normals from mesh loops, assumes 1 normal per real vertex
-            morph_mesh.calc_normals_split()
-            morph_normals = [list()] * len(morph_mesh.vertices)
-            for loop in morph_mesh.loops:
-                morph_normals[loop.vertex_index] = loop.normal
-
-            # Positions
-            original_positions = [v.co for v in mesh_instance.vertices]
-            morph_positions    = [v.co for v in morph_mesh.vertices]
-
-            final_positions = [[0,0,0]] * vert_count
-            final_normals   = [[0,0,0]] * vert_count
-
-            # Get deltas, swap axis and put into element_data
-            for i in range(vert_count):
-                vertex = Vertex()
-                pos_delta = self.delta(morph_positions[i], original_positions[i])
-                nor_delta = self.delta(morph_normals[i], original_normals[i])
-
-                vertex.position = (
-                    pos_delta[0],
-                    pos_delta[2],
-                    -pos_delta[1]
-                )
-                vertex.normal = (
-                    nor_delta[0],
-                    nor_delta[2],
-                    -nor_delta[1]
-                )
-                element_data.append(vertex)
-            
-            geom_data.faces = faces
 
-            # Set Vertex IDs
-            for key, values in original_object.get('vert_ids').items():
-                for v in values:
-                    element_data[v].vertex_id = [int(key, 0)]
+            morph_name = morph_obj.get('morph_name', morph_obj.name)
+            filepath = self.filepath.split(".simgeom")[0] + "_" + morph_name + ".simgeom"
+            morph_files[filepath] = MorphWriter.buildMorph(
+                MorphWriter.getDeltas( base_positions, vertex_positions(morph_mesh) ),
+                MorphWriter.getDeltas( base_normals, vertex_normals(morph_mesh) ),
+                faces, bones, vertex_ids, sort_order, merge_group
+            )
+
+        # Morphs stored as shape keys, offsets are taken relative to the key they're based on
+        morph_keys = morph_shape_keys(original_object)
+        for key in morph_keys:
+            if vert_count != len(key.data):
+                mismatch_count += 1
+                continue
 
-            geom_data.element_data = element_data
+            # Unedited imported keys carry the file's normal offsets, others get them from the key's vertex normals
+            normal_deltas = get_shape_key_normals(original_object, key)
+            if normal_deltas is None:
+                normal_deltas = MorphWriter.getDeltas( shape_key_normals(key.relative_key), shape_key_normals(key) )
 
-            # Fill the bone array
-            geom_data.bones = bones
-            
-            # Set Header data
-            emtpy_tgi = {
-                'type': "0x0",
-                'group': "0x0",
-                'instance': "0x0"
-            }
-
-            # Set Header Info
-            geom_data.internal_chunks = []
-            geom_data.internal_chunks.append(emtpy_tgi)
-            geom_data.external_resources = []
-            geom_data.shaderdata = []
-            geom_data.tgi_list = []
-            geom_data.tgi_list.append(emtpy_tgi)
-            geom_data.sort_order = original_object.get('sortorder', 0)
-            geom_data.merge_group = original_object.get('mergegroup', 0)
-            geom_data.skin_controller_index = 0
-            geom_data.embeddedID = "0x0"
+            filepath = self.filepath.split(".simgeom")[0] + "_" + key.name + ".simgeom"
+            morph_files[filepath] = MorphWriter.buildMorph(
+                MorphWriter.getDeltas( shape_key_positions(key.relative_key), shape_key_positions(key) ),
+                normal_deltas,
+                faces, bones, vertex_ids, sort_order, merge_group
+            )
+        morphs = morphs + morph_keys
 
-            morph_name = morph_obj.get('morph_name', morph_obj.name)
-            filepath = self.filepath.split(".simgeom")[0] + "_" + morph_name + ".simgeom"
-            GeomWriter.writeGeom(filepath, geom_data)
+        errors = [ (filepath, error) for filepath, error in MorphWriter.writeMorphs(morph_files).items() if error ]
+        for filepath, error in errors:
+            print(f"Failed to write morph {filepath}: {error}")
         
         if mismatch_count > 0:
              self.report({'ERROR'}, f"{mismatch_count}/{len(morphs)} morphs failed to export due to vertex count mismatch.")
-    
-
-    def delta(self, a: tuple, b: tuple):
-        """ Calculate the delta between two 3D lists/tuples """
-        c = (
-            a[0] - b[0],
-            a[1] - b[1],
-            a[2] - b[2]
-        )
-        return c
+        if errors:
+             self.report({'ERROR'}, f"{len(errors)}/{len(morphs)} morphs could not be written, see the console for details.")
     
 
     def veclength(self, v: tuple):
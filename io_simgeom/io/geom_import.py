@@ -16,6 +16,7 @@
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+from array                  import array
 from typing                 import List
 import traceback
 
@@ -34,7 +35,10 @@ import json
 
 from io_simgeom.io.geom_load    import GeomLoader
 from io_simgeom.models.geom     import Geom
+from io_simgeom.util.mesh       import add_vertices, add_triangles, add_uv_layer, add_vertex_colors, set_smooth, to_blender_axes
 from io_simgeom.util.globals    import Globals
+from io_simgeom.util.vertexids  import set_vertex_ids
+from io_simgeom.util.weights    import bucket_weights
 
 
 class SIMGEOM_OT_import_geom(Operator, ImportHelper):
@@ -73,38 +77,33 @@ class SIMGEOM_OT_import_geom(Operator, ImportHelper):
     def execute(self, context):
         # Import Rig, checks are done in Rig Importer
         rigpath = Globals.ROOTDIR + '/data/rigs/' + self.rig_type + '.grannyrig'
-        bpy.ops.simgeom.import_rig(filepath = rigpath)
+        bpy.ops.simgeom.import_rig(filepath = rigpath, reuse_existing = True)
 
         # Load the GEOM data
         geomdata = GeomLoader.readGeom(self.filepath)
 
-        # Fill a Dictionairy with hexed Vertex ID as key and List of vertex indices
-        lowest_id = 0x7fffffff
-        ids = {}
-        if geomdata.element_data[0].vertex_id:
-            for i, v in enumerate(geomdata.element_data):
-                if v.vertex_id[0] < lowest_id:
-                    lowest_id = v.vertex_id[0]
-                if not hex(v.vertex_id[0]) in ids:
-                    ids[hex(v.vertex_id[0])] = [i]
-                else:
-                    ids[hex(v.vertex_id[0])].append(i)
-
-        # Build vertex array and get face array to build the mesh
-        vertices = [ (v.position[0], -v.position[2], v.position[1] ) for v in geomdata.element_data ]
+        vertices = geomdata.vertex_buffer
         faces    = geomdata.faces
+
+        # One vertex ID per vertex, shared by vertices on UV seams
+        lowest_id = 0x7fffffff
+        vertex_ids = None
+        if vertices.vertex_id is not None:
+            vertex_ids = array('i', vertices.vertex_id.tolist())
+            lowest_id = min(vertex_ids, default=lowest_id)
+
+        # Build the mesh straight from the vertex and index arrays
         mesh     = bpy.data.meshes.new("geom")
         obj      = bpy.data.objects.new("geom", mesh)
-        mesh.from_pydata(vertices, [], faces)
+        add_vertices(mesh, to_blender_axes(vertices.position))
+        add_triangles(mesh, faces)
 
         # Shade smooth before applying custom normals
-        for poly in mesh.polygons:
-            poly.use_smooth = True
+        set_smooth(mesh)
 
         # Add custom split normals layer if enabled
-        if self.do_import_normals:
-            normals = [ (v.normal[0], -v.normal[2], v.normal[1]) for v in geomdata.element_data ]
-            mesh.normals_split_custom_set_from_vertices(normals)
+        if self.do_import_normals and vertices.normal is not None:
+            mesh.normals_split_custom_set_from_vertices( to_blender_axes(vertices.normal) )
             mesh.use_auto_smooth = True
 
         # Link the newly created object to the active collection
@@ -119,52 +118,27 @@ class SIMGEOM_OT_import_geom(Operator, ImportHelper):
         # Set Vertex Groups
         for bone in geomdata.bones:
             obj.vertex_groups.new(name=bone)
+        groups = [obj.vertex_groups[bone] for bone in geomdata.bones]
         
-        # Set Vertex Group Weights
+        # Set Vertex Group Weights, one call per bone and weight
         skip_counter = 0
-        if geomdata.element_data[0].assignment:
-            for i, vert in enumerate(geomdata.element_data):
-                for j in range(4):
-                    group_index = vert.assignment[j]
-                    if group_index >= len(geomdata.bones):
-                        skip_counter += 1
-                        continue
-                    groupname = geomdata.bones[group_index]
-                    vertgroup = obj.vertex_groups[groupname]
-                    weight = vert.weights[j]
-                    if weight > 0:
-                        vertgroup.add( [i], weight, 'ADD' )
+        if vertices.assignment is not None:
+            buckets, skip_counter = bucket_weights(vertices.assignment, vertices.weights, len(groups))
+            for group_index, weight, indices in buckets:
+                groups[group_index].add( indices, weight, 'ADD' )
         print(f"Skipped {skip_counter} bone assignments that were out of range.")
         
         # Set UV Coordinates for every UV channel
-        if geomdata.element_data[0].uv:
-            for i in range(len(geomdata.element_data[0].uv)):
-                mesh.uv_layers.new(name='UV_' + str(i))
-                mesh.uv_layers.active = mesh.uv_layers['UV_' + str(i)]
-
-                for j, polygon in enumerate(mesh.polygons):
-                    for k, loopindex in enumerate(polygon.loop_indices):
-                        meshuvloop = mesh.uv_layers.active.data[loopindex]
-                        vertex_index = geomdata.faces[j][k]
-                        uv = geomdata.element_data[vertex_index].uv[i]
-                        meshuvloop.uv = (uv[0], -uv[1] + 1)
+        if vertices.uv:
+            for i, uv in enumerate(vertices.uv):
+                add_uv_layer(mesh, 'UV_' + str(i), uv)
             mesh.uv_layers.active = mesh.uv_layers['UV_0']
 
         bpy.ops.object.mode_set(mode='OBJECT')
 
         # Set Vertex Colors
-        if geomdata.element_data[0].tagvalue:
-            float_colors = []
-            for el in geomdata.element_data:
-                float_color = []
-                for val in el.tagvalue:
-                    float_color.append(val / 255)
-                float_colors.append(float_color)
-            
-            vcol_layer = mesh.vertex_colors.new(name="SIMGEOM_TAGVAL", do_init=False)
-            for poly in mesh.polygons:
-                for vert_index, loop_index in zip(poly.vertices, poly.loop_indices):
-                    vcol_layer.data[loop_index].color = float_colors[vert_index]
+        if vertices.tagvalue is not None:
+            add_vertex_colors(mesh, "SIMGEOM_TAGVAL", vertices.tagvalue)
 
         # Set Custom Properties
         self.add_prop(obj, '__GEOM__', 1)
@@ -176,7 +150,8 @@ class SIMGEOM_OT_import_geom(Operator, ImportHelper):
         self.add_prop(obj, 'skincontroller', geomdata.skin_controller_index)
         self.add_prop(obj, 'tgis', geomdata.tgi_list)
         self.add_prop(obj, 'embedded_id', geomdata.embeddedID)
-        self.add_prop(obj, 'vert_ids', ids)
+        if vertex_ids is not None:
+            set_vertex_ids(obj, vertex_ids)
         start_id_descript = "Starting Vertex ID"
         for key, value in Globals.CAS_INDICES.items():
             start_id_descript += "\n" + str(key) + " - " + str(value)
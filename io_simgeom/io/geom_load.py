@@ -15,21 +15,98 @@
 # You should have received a copy of the GNU General Public License
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
+from array                        import array
+import mmap
+import os
+import traceback
+
+from io_simgeom.models.face       import FaceBuffer
 from io_simgeom.models.geom       import Geom
-from io_simgeom.models.vertex     import Vertex
-from io_simgeom.util.bytereader   import ByteReader
+from io_simgeom.models.vertex     import VertexBuffer, ELEMENT_TYPES
+from io_simgeom.util.bytereader   import ByteReader, BIG_ENDIAN
 from io_simgeom.util.globals      import Globals
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class GeomLoader:
     
 
     @staticmethod
-    def readGeom(filepath: str) -> Geom:
-        geomdata = None
+    def readGeom(filepath: str, lazy: bool = False, use_mmap: bool = False) -> Geom:
+        """
+        use_mmap reads through a read-only memory map instead of reading the whole file,
+        only the pages that get decoded are loaded and they are shared through the page cache.
+        """
         with open(filepath, "rb") as f:
-            geomdata = f.read()
+            geomdata = GeomLoader.readData(f, use_mmap)
+
+        meshdata = None
+        try:
+            meshdata = GeomLoader.geomFromData(geomdata, lazy)
+        except Exception as e:
+            # The traceback holds the decoder's views into the map, drop them so it can be closed
+            traceback.clear_frames(e.__traceback__)
+            raise
+        finally:
+            # Lazily read GEOMs keep the map open until the geometry is decoded or the Geom is collected
+            if meshdata is None or not lazy:
+                GeomLoader.closeData(geomdata)
+
+        return meshdata
+    
+
+    @staticmethod
+    def readGeomColumns(filepath: str, names, use_mmap: bool = False) -> Geom:
+        """
+        Read a GEOM but only decode the given vertex attributes, faces are decoded on first access.
+        With use_mmap the faces are decoded right away, the map is closed before returning.
+        """
+        with open(filepath, "rb") as f:
+            geomdata = GeomLoader.readData(f, use_mmap)
+
+        try:
+            meshdata = GeomLoader.geomFromData(geomdata, lazy=True)
+            meshdata.vertex_buffer = GeomLoader.getVerticesAt(geomdata, meshdata, names)
+            if use_mmap:
+                meshdata.faces = GeomLoader.getFacesAt(geomdata, meshdata)
+            return meshdata
+        except Exception as e:
+            traceback.clear_frames(e.__traceback__)
+            raise
+        finally:
+            GeomLoader.closeData(geomdata)
+    
+
+    @staticmethod
+    def readData(f, use_mmap: bool = False):
+        """Contents of an open GEOM file, or a read-only memory map of it. Empty files can't be mapped and are read instead."""
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+    
+
+    @staticmethod
+    def closeData(geomdata):
+        """Close a memory map from readData, one that still has views in use is left to the garbage collector"""
+        if isinstance(geomdata, mmap.mmap):
+            try:
+                geomdata.close()
+            except BufferError:
+                pass
+    
 
+    @staticmethod
+    def readGeomHeader(filepath: str, use_mmap: bool = False) -> Geom:
+        """Read everything but the geometry, vertices and faces are decoded on first access"""
+        return GeomLoader.readGeom(filepath, lazy=True, use_mmap=use_mmap)
+    
+
+    @staticmethod
+    def geomFromData(geomdata: bytes, lazy: bool = False) -> Geom:
         meshdata    = Geom()
         reader      = ByteReader(geomdata)
 
@@ -63,8 +140,26 @@ class GeomLoader:
         vertex_count            = reader.getUint32()
         element_count           = reader.getUint32()
 
-        meshdata.element_data   = GeomLoader.getElementData(reader, element_count, vertex_count)
-        meshdata.faces          = GeomLoader.getGroupData(reader)
+        layout                  = GeomLoader.getElementLayout(reader, element_count)
+        meshdata.vertex_count   = vertex_count
+        meshdata.element_layout = layout
+        meshdata.vertex_offset  = reader.getOffset()
+        if lazy:
+            reader.skip( GeomLoader.getStride(layout) * vertex_count )
+            meshdata.setLoader('vertex_buffer', lambda: GeomLoader.getVerticesAt(geomdata, meshdata))
+        else:
+            meshdata.vertex_buffer = VertexBuffer(vertex_count, GeomLoader.getElementColumns(reader, layout, vertex_count))
+
+        # Index buffer, skip the same 5 bytes as getGroupData
+        numfacepoints           = GeomLoader.peekFacePointCount(reader)
+        meshdata.face_count     = numfacepoints // 3
+        meshdata.index_offset   = reader.getOffset() + 9
+        if lazy:
+            reader.skip( 9 + 2 * numfacepoints )
+            meshdata.setLoader('faces', lambda: GeomLoader.getFacesAt(geomdata, meshdata))
+        else:
+            meshdata.faces      = GeomLoader.getGroupData(reader)
+            reader.setOffset( meshdata.index_offset + 2 * numfacepoints )
 
         meshdata.skin_controller_index = reader.getUint32()
         meshdata.bones          = GeomLoader.getBones(reader)
@@ -77,6 +172,32 @@ class GeomLoader:
         return meshdata
     
 
+    @staticmethod
+    def getVerticesAt(geomdata: bytes, meshdata: Geom, names = None) -> VertexBuffer:
+        """Decode the vertex block of a lazily read GEOM from its recorded offset"""
+        reader = ByteReader(geomdata)
+        reader.setOffset(meshdata.vertex_offset)
+        columns = GeomLoader.getElementColumns(reader, meshdata.element_layout, meshdata.vertex_count, names)
+        return VertexBuffer(meshdata.vertex_count, columns)
+    
+
+    @staticmethod
+    def getFacesAt(geomdata: bytes, meshdata: Geom) -> FaceBuffer:
+        """Decode the index buffer of a lazily read GEOM from its recorded offset"""
+        reader = ByteReader(geomdata)
+        reader.setOffset(meshdata.index_offset)
+        return FaceBuffer( reader.getUint16s(meshdata.face_count * 3) )
+    
+
+    @staticmethod
+    def peekFacePointCount(reader: ByteReader) -> int:
+        offset = reader.getOffset()
+        reader.skip(5)
+        count = reader.getUint32()
+        reader.setOffset(offset)
+        return count
+    
+
     @staticmethod
     def getFloatList(reader: ByteReader, count: int) -> list:
         data = []
@@ -157,55 +278,89 @@ class GeomLoader:
     
 
     @staticmethod
-    def getElementData(reader: ByteReader, element_count: int, vert_count: int) -> list:
-        vertices = []
+    def getElementData(reader: ByteReader, element_count: int, vert_count: int) -> VertexBuffer:
+        layout  = GeomLoader.getElementLayout(reader, element_count)
+        columns = GeomLoader.getElementColumns(reader, layout, vert_count)
+        return VertexBuffer(vert_count, columns)
+    
 
-        datatypes = []
+    @staticmethod
+    def getElementLayout(reader: ByteReader, element_count: int) -> list:
+        """Read the vertex element declarations and compile them into a record layout"""
+        layout = []
+        offset = 0
         for _ in range(element_count):
-            datatypes.append(reader.getUint32())
-            reader.skip(5)
-        
-        for _ in range(vert_count):
-            vertex = Vertex()
-            for datatype in datatypes:
-                if datatype == 1:
-                    vertex.position = GeomLoader.getFloatList(reader, 3)
-                elif datatype == 2:
-                    vertex.normal = GeomLoader.getFloatList(reader, 3)
-                elif datatype == 3:
-                    if not vertex.uv:
-                        vertex.uv = [GeomLoader.getFloatList(reader, 2)]
-                    else:
-                        vertex.uv.append(GeomLoader.getFloatList(reader, 2))
-                elif datatype == 4:
-                    vertex.assignment = GeomLoader.getByteList(reader, 4)
-                elif datatype == 5:
-                    vertex.weights = GeomLoader.getFloatList(reader, 4)
-                elif datatype == 6:
-                    vertex.tangent = GeomLoader.getFloatList(reader, 3)
-                elif datatype == 7:
-                    vertex.tagvalue = GeomLoader.getByteList(reader, 4)
-                elif datatype == 10:
-                    vertex.vertex_id = [reader.getUint32()]
-            vertices.append(vertex)
-
-        return vertices
-    
-
-    @staticmethod
-    def getGroupData(reader: ByteReader) -> list:
-        faces = []
+            datatype = reader.getUint32()
+            reader.skip(4)
+            size = reader.getByte()
+            element = {'type': datatype, 'name': None, 'width': 0, 'typecode': None, 'offset': offset, 'size': size}
+            if datatype in ELEMENT_TYPES:
+                name, width, typecode = ELEMENT_TYPES[datatype]
+                element['name']     = name
+                element['width']    = width
+                element['typecode'] = typecode
+                element['size']     = width * array(typecode).itemsize
+            layout.append(element)
+            offset += element['size']
+        return layout
+    
+
+    @staticmethod
+    def getStride(layout: list) -> int:
+        if not layout:
+            return 0
+        return layout[-1]['offset'] + layout[-1]['size']
+    
+
+    @staticmethod
+    def getElementColumns(reader: ByteReader, layout: list, vert_count: int, names = None) -> dict:
+        """
+        Decode the interleaved vertex block in a single pass into one packed array per attribute.
+        UV layers are returned as a list of arrays under the 'uv' key.
+        When names is given only those attributes are decoded, the reader still moves past the whole block.
+        """
+        stride  = GeomLoader.getStride(layout)
+        block   = reader.getRawView(stride * vert_count)
+        columns = {}
+
+        elements = [e for e in layout if e['name'] is not None and (names is None or e['name'] in names)]
+        if np is not None:
+            dtype = np.dtype({
+                'names':    [f"e{i}" for i in range(len(elements))],
+                'formats':  [(np.dtype(e['typecode']).newbyteorder('<'), (e['width'],)) for e in elements],
+                'offsets':  [e['offset'] for e in elements],
+                'itemsize': stride
+            })
+            records = np.frombuffer(block, dtype=dtype, count=vert_count)
+
+        for i, element in enumerate(elements):
+            if np is not None:
+                column = records[f"e{i}"].astype(element['typecode']).reshape(-1)
+            else:
+                # Gather the element's bytes out of every record with strided slices
+                size = element['size']
+                packed = bytearray(size * vert_count)
+                for k in range(size):
+                    packed[k::size] = block[element['offset'] + k::stride]
+                column = array(element['typecode'])
+                column.frombytes(packed)
+                if BIG_ENDIAN:
+                    column.byteswap()
+
+            if element['name'] == 'uv':
+                columns.setdefault('uv', []).append(column)
+            else:
+                columns[element['name']] = column
+
+        return columns
+    
+
+    @staticmethod
+    def getGroupData(reader: ByteReader) -> FaceBuffer:
         reader.skip(5)
 
         numfacepoints = reader.getUint32()
-        for _ in range( int(numfacepoints / 3) ):
-            faces.append([
-                reader.getInt16(),
-                reader.getInt16(),
-                reader.getInt16()
-            ])
-
-        return faces
+        return FaceBuffer( reader.getUint16s(numfacepoints - numfacepoints % 3) )
 
 
     @staticmethod
@@ -15,8 +15,12 @@
 # You should have received a copy of the GNU General Public License
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
+from array                        import array
+
+from io_simgeom.models.face       import FaceBuffer
 from io_simgeom.models.geom       import Geom
-from io_simgeom.models.vertex     import Vertex
+from io_simgeom.models.vertex     import VertexBuffer
+from io_simgeom.util.bytereader   import BIG_ENDIAN
 from io_simgeom.util.bytewriter   import ByteWriter
 from io_simgeom.util              import fnv
 
@@ -30,17 +34,130 @@ http://simswiki.info/wiki.php?title=Sims_3:Key_table
 """
 class GeomWriter:
 
+    # Vertex element declarations: datatype, format, bytesize, typecode
+    DATATYPES = {
+        'position':     [1,  1, 12, 'f'],
+        'normal':       [2,  1, 12, 'f'],
+        'uv':           [3,  1, 8,  'f'],
+        'assignment':   [4,  2, 4,  'B'],
+        'weights':      [5,  1, 16, 'f'],
+        'tangent':      [6,  1, 12, 'f'],
+        'tagvalue':     [7,  3, 4,  'B'],
+        'vertex_id':    [10, 4, 4,  'I'],
+    }
+
+
+    # Bytes per write when streaming
+    CHUNK_SIZE = 1 << 16
+
 
     @staticmethod
     def writeGeom(filepath: str, geomData: Geom) -> None:
         with open(filepath, "wb+") as f:
-            f.write(GeomWriter.buildData(geomData))
+            GeomWriter.streamGeom(f, geomData)
+    
+
+    @staticmethod
+    def streamGeom(stream, geomData: Geom, chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        Write a GEOM to any binary file-like object in chunks of about chunk_size bytes.
+        All size and offset fields are precomputed, so the stream is never seeked.
+        """
+        layout = GeomWriter.getLayout(geomData)
+
+        b = ByteWriter(layout['head_size'])
+        GeomWriter.writeHeader(b, geomData, layout)
+        stream.write(b.getData())
+
+        vertices = layout['vertices']
+        stride = layout['stride']
+        step = max(1, chunk_size // max(1, stride))
+        for start in range(0, len(vertices), step):
+            end = min(start + step, len(vertices))
+            b = ByteWriter(stride * (end - start), header=False)
+            GeomWriter.writeVertices(b, vertices, layout['order'], stride, start, end)
+            stream.write(b.getData())
+
+        b = ByteWriter(9, header=False)
+        GeomWriter.writeFaceHeader(b, layout['indices'])
+        stream.write(b.getData())
+        packed = GeomWriter.packArray(layout['indices'], 'H')
+        for start in range(0, len(packed), chunk_size):
+            stream.write(packed[start:start + chunk_size])
+
+        b = ByteWriter(header=False)
+        GeomWriter.writeFooter(b, geomData)
+        stream.write(b.getData())
     
 
     @staticmethod
     def buildData(geomData: Geom) -> bytearray:
-        b = ByteWriter()
+        """Build the whole file in a single buffer allocated at its final size"""
+        layout = GeomWriter.getLayout(geomData)
+        b = ByteWriter(layout['size'])
+
+        GeomWriter.writeHeader(b, geomData, layout)
+        GeomWriter.writeVertices(b, layout['vertices'], layout['order'], layout['stride'])
+        GeomWriter.writeFaceHeader(b, layout['indices'])
+        b.setBytes( GeomWriter.packArray(layout['indices'], 'H') )
+        GeomWriter.writeFooter(b, geomData)
+        # GEOM File is now successfully written
 
+        return b.getData()
+    
+
+    @staticmethod
+    def getLayout(geomData: Geom) -> dict:
+        """Pack the vertex and face data and precompute every size and offset field of the file"""
+        vertices    = VertexBuffer.fromVertices(geomData.element_data)
+        order       = GeomWriter.getVertexOrder(vertices)
+        stride      = sum(GeomWriter.DATATYPES[name][2] for name, _layer in order)
+        indices     = GeomWriter.getIndices(geomData.faces)
+
+        # Remove type 4, size 5 entries, these seem to break stuff somehow
+        shaderdata = []
+        if geomData.embeddedID != hex(0):
+            shaderdata = [d for d in geomData.shaderdata if not (d['type'] == 4 and d['size'] == 5)]
+
+        rcol_size       = 12 + 8 + 16 * len(geomData.internal_chunks) + 16 * len(geomData.external_resources)
+        chunk_offset    = rcol_size + 8
+        mtnf_size       = 0
+        if geomData.embeddedID != hex(0):
+            mtnf_size = 16 + 16 * len(shaderdata)
+            for d in shaderdata:
+                if d['type'] in (1, 2):
+                    mtnf_size += 4 * len(d['data'])
+                elif d['type'] == 4 and d['size'] == 4:
+                    mtnf_size += 16
+            mtnf_size_field = 8
+        else:
+            mtnf_size_field = 4
+        head_size       = chunk_offset + 16 + mtnf_size_field + mtnf_size + 16 + 9 * len(order)
+        vertices_size   = stride * len(vertices)
+        faces_size      = 9 + 2 * len(indices)
+        bones_size      = 8 + 4 * len(geomData.bones)
+        tgi_size        = 4 + 16 * len(geomData.tgi_list)
+        size            = head_size + vertices_size + faces_size + bones_size + tgi_size
+
+        return {
+            'vertices':     vertices,
+            'order':        order,
+            'stride':       stride,
+            'indices':      indices,
+            'shaderdata':   shaderdata,
+            'chunk_offset': chunk_offset,
+            'chunk_size':   size - chunk_offset,
+            'mtnf_size':    mtnf_size,
+            # From the end of the TGI offset DWORD to the start of the TGI list
+            'tgi_offset':   size - tgi_size - (chunk_offset + 12),
+            'head_size':    head_size,
+            'size':         size
+        }
+    
+
+    @staticmethod
+    def writeHeader(b: ByteWriter, geomData: Geom, layout: dict):
+        """Write everything up to and including the vertex element declarations"""
         # RCOL HEADER
         b.setUInt32( len(geomData.external_resources) )
         b.setUInt32( len(geomData.internal_chunks) )
@@ -52,15 +169,13 @@ class GeomWriter:
             b.setUInt64( int(geomData.internal_chunks[i]['instance'], 0) )
             b.setUInt32( int(geomData.internal_chunks[i]['type'], 0) )
             b.setUInt32( int(geomData.internal_chunks[i]['group'], 0) )
-        b.setUInt32( b.getLength() + 8 )    # The start of the GEOM Chunk is in 2 more DWORDs
-        chunksize_offset = b.getLength()    # save Chunk size byte offset
-        b.setUInt32(0xFFFFFFFF)             # GEOM Chunk size will have to be replaced when everything is written
+        b.setUInt32( layout['chunk_offset'] )
+        b.setUInt32( layout['chunk_size'] )
 
         # GEOM HEADER
         b.setIdentifier("GEOM")             # Chunk identifier
         b.setUInt32(5)                      # Version is always 5
-        tgi_offset = b.getLength()          # will have to be replaced when everything is written
-        b.setUInt32(0xFFFFFFFF)             # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+        b.setUInt32( layout['tgi_offset'] )
         tgilen = 4 + len(geomData.tgi_list) * 16
         b.setUInt32(tgilen)                 # TGI Size
 
@@ -71,23 +186,16 @@ class GeomWriter:
                 b.setUInt32( int(embedded_id, 0) )
             else:
                 b.setUInt32( fnv.fnv32(embedded_id) )
-            mtnfsize_offset = b.getLength()
-            b.setUInt32(0xFFFFFFFF)             # MTNF Chunk Size will have to be calculated after it has been written
+            b.setUInt32( layout['mtnf_size'] )
             b.setIdentifier("MTNF")
             b.setUInt64(0x0000007400000000)     # unknown DWORD, WORD, WORD; Seem to always be these values
-            shaderdata = []                     # Remove type 4, size 5 entries, these seem to break stuff somehow
-            for d in geomData.shaderdata:
-                if d['type'] == 4 and d['size'] == 5:
-                    continue
-                shaderdata.append(d)
+            shaderdata = layout['shaderdata']
             b.setUInt32( len(shaderdata) )
             offset = 16 + len(shaderdata) * 16
             # Shader parameter info
-            for d in shaderdata:
-                if d['name'][0:2] == '0x':
-                    b.setUInt32( int(d['name'], 0) )
-                else:
-                    b.setUInt32( fnv.fnv32(d['name']) )
+            hashes = GeomWriter.getHashes([d['name'] for d in shaderdata])
+            for d, name_hash in zip(shaderdata, hashes):
+                b.setUInt32( name_hash )
                 b.setUInt32( d['type'] )
                 b.setUInt32( d['size'] )
                 b.setUInt32(offset)
@@ -105,80 +213,104 @@ class GeomWriter:
                     if d['size'] == 4:
                         b.setUInt64(d['data'])
                         b.setUInt64(0)
-            # Replace MTNF Chunksize data, -4 to go back to the start location of the DWORD
-            b.replaceAt( mtnfsize_offset, 'I', b.getLength() - mtnfsize_offset - 4 )
         else:
             b.setUInt32(0)
 
         # GEOM DATA
         b.setUInt32(geomData.merge_group)
         b.setUInt32(geomData.sort_order)
-        b.setUInt32(len(geomData.element_data))         # Vertex Count
-
-        order = GeomWriter.set_vertex_info(geomData.element_data[0], b)
-        # Set the values for vertex data
-        for vertex in geomData.element_data:
-            uv_layer = 0
-            for entry in order:
-                var = getattr(vertex, entry[0])
-                if entry[0] == 'uv':
-                    var = getattr(vertex, entry[0])[uv_layer]
-                    uv_layer += 1
-                for val in var:
-                    b.setArbitrary(entry[1], val)
+        b.setUInt32(len(layout['vertices']))            # Vertex Count
+        b.setUInt32(len(layout['order']))               # Element Count
+        for name, _layer in layout['order']:
+            values = GeomWriter.DATATYPES[name]
+            b.setUInt32(values[0])
+            b.setUInt32(values[1])
+            b.setByte(values[2])
+    
+
+    @staticmethod
+    def writeVertices(b: ByteWriter, vertices: VertexBuffer, order: list, stride: int, start: int = 0, end: int = None):
+        """Interleave the packed vertex columns into the vertex block, one strided copy per byte lane"""
+        if end is None:
+            end = len(vertices)
+        count = end - start
+        block_start = b.reserve(stride * count)
+        block_end = block_start + stride * count
 
+        offset = 0
+        for name, layer in order:
+            _datatype, _format, size, typecode = GeomWriter.DATATYPES[name]
+            column = getattr(vertices, name)
+            if layer is not None:
+                column = column[layer]
+            width = size // array(typecode).itemsize
+            packed = GeomWriter.packArray(column[start*width:end*width], typecode)
+            for k in range(size):
+                b.data[block_start + offset + k:block_end:stride] = packed[k::size]
+            offset += size
+    
+
+    @staticmethod
+    def writeFaceHeader(b: ByteWriter, indices):
         b.setUInt32(1)
         b.setByte(2)
-        b.setUInt32(len(geomData.faces) * 3)
-        for face in geomData.faces:
-            for vert in face:
-                b.setUInt16(vert)
+        b.setUInt32(len(indices))
+    
+
+    @staticmethod
+    def writeFooter(b: ByteWriter, geomData: Geom):
+        """Write the skin controller, bones and TGI list following the face data"""
         b.setUInt32(geomData.skin_controller_index)
         b.setUInt32(len(geomData.bones))
-        for bone in geomData.bones:
-            if bone[0:2] == '0x':
-                b.setUInt32(int(bone, 0))
-            else:
-                b.setUInt32(fnv.fnv32(bone))
-        b.replaceAt(tgi_offset, 'I', b.getLength() - tgi_offset - 4)    # Replace TGI Offset with the proper value
+        b.setBytes( GeomWriter.packArray(GeomWriter.getHashes(geomData.bones), 'I') )
         b.setUInt32(len(geomData.tgi_list))
         for tgi in geomData.tgi_list:
             b.setUInt32( int(tgi['type'], 0) )
             b.setUInt32( int(tgi['group'], 0) )
             b.setUInt64( int(tgi['instance'], 0) )
-        b.replaceAt(chunksize_offset, 'I', b.getLength() - chunksize_offset - 4)    # Replace GEOM Chunk Size value
-        # GEOM File is now successfully written
+    
 
-        return b.getData()
+    @staticmethod
+    def getVertexOrder(vertices: VertexBuffer) -> list:
+        """Elements present in the vertex buffer as (attribute, uv layer) pairs, in file order"""
+        order = []
+        for key in GeomWriter.DATATYPES:
+            column = getattr(vertices, key)
+            if column is None:
+                continue
+            if key == 'uv':
+                for layer in range(len(column)):
+                    order.append((key, layer))
+            else:
+                order.append((key, None))
+        return order
     
 
     @staticmethod
-    def set_vertex_info(vertex: Vertex, writer: ByteWriter) -> list:
-        datatypes = {
-            'position':     [1,  1, 12, 'f'],
-            'normal':       [2,  1, 12, 'f'],
-            'uv':           [3,  1, 8,  'f'],
-            'assignment':   [4,  2, 4,  'B'],
-            'weights':      [5,  1, 16, 'f'],
-            'tangent':      [6,  1, 12, 'f'],
-            'tagvalue':     [7,  3, 4,  'B'],
-            'vertex_id':    [10, 4, 4,  'I'],
-        }
+    def getHashes(names: list) -> list:
+        """fnv32 hashes of bone or shader parameter names, names that are still a hex hash are kept as is"""
+        hashes = fnv.fnv32_many(names)
+        for i, name in enumerate(names):
+            if name[0:2] == '0x':
+                hashes[i] = int(name, 0)
+        return hashes
+    
 
-        order = []
+    @staticmethod
+    def getIndices(faces):
+        """Flat face indices from a FaceBuffer or a list of triangles"""
+        if isinstance(faces, FaceBuffer):
+            return faces.indices
+        return array('H', [i for face in faces for i in face])
+    
 
-        for key, values in datatypes.items():
-            if getattr(vertex, key):
-                if key == 'uv':
-                    for _ in range(len(vertex.uv)):
-                        order.append([key, values[3]])
-                else:
-                    order.append([key, values[3]])
-        writer.setUInt32(len(order))    # Element Count
-        for item in order:
-            values = datatypes[item[0]]
-            writer.setUInt32(values[0])
-            writer.setUInt32(values[1])
-            writer.setByte(values[2])
-        
-        return order
+    @staticmethod
+    def packArray(values, typecode: str) -> memoryview:
+        """Little endian bytes of an array.array, NumPy array or plain sequence"""
+        if hasattr(values, 'astype'):
+            return memoryview(values.astype('<' + typecode).tobytes())
+        if not isinstance(values, array) or values.typecode != typecode or BIG_ENDIAN:
+            values = array(typecode, values)
+        if BIG_ENDIAN:
+            values.byteswap()
+        return memoryview(values).cast('B')
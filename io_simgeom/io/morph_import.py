@@ -19,14 +19,17 @@ import os
 from typing                 import List
 
 import bpy
+import numpy as np
 
 from mathutils              import Vector
 from bpy_extras.io_utils    import ImportHelper
 from bpy.props              import StringProperty, CollectionProperty, BoolProperty
 from bpy.types              import Operator, PropertyGroup
 
-from io_simgeom.io.geom_load    import GeomLoader
+from io_simgeom.io.morph_load   import MorphLoader
 from io_simgeom.models.geom     import Geom
+from io_simgeom.util.mesh       import add_vertices, add_triangles, set_smooth, vertex_positions, vertex_normals
+from io_simgeom.util.mesh       import morph_shape_keys, set_shape_key, set_shape_key_normals, shape_key_positions
 
 
 class SIMGEOM_OT_import_morph(Operator, ImportHelper):
@@ -45,10 +48,15 @@ class SIMGEOM_OT_import_morph(Operator, ImportHelper):
         description = "Import the original normals as custom split normals (recommended)",
         default = True
     )
+    do_import_shape_keys: BoolProperty(
+        name = "As Shape Keys",
+        description = "Add the morphs as shape keys on the base mesh instead of as separate objects. "
+                      "Their normal offsets are stored on the object and exported unchanged until the key is edited",
+        default = False
+    )
 
     def execute(self, context):
         geom_obj = context.active_object
-        geom_mesh = geom_obj.data
 
         if geom_obj == None:
             self.report({'ERROR'}, "No base mesh selected, can't import morphs")
@@ -56,26 +64,33 @@ class SIMGEOM_OT_import_morph(Operator, ImportHelper):
         if not geom_obj.get('__GEOM__'):
             self.report({'ERROR'}, "Selected base mesh is not a GEOM, can't import morphs")
             return {'CANCELLED'}
+        geom_mesh = geom_obj.data
         
-        # Get list of original normals for later
-        geom_normals = [[0,0,0]] * len(geom_mesh.vertices)
-        geom_mesh.calc_normals_split()
-        for loop in geom_mesh.loops:
-            geom_normals[loop.vertex_index] = loop.normal
-
-        for geom_file in self.files:
-            directory = os.path.dirname(self.filepath)
-            filepath = os.path.join(directory, geom_file.name)
-            # Load the GEOM data
-            morph_geomdata = GeomLoader.readGeom(filepath)
-
-            if len(morph_geomdata.element_data) != len(geom_mesh.vertices):
+        # Snapshot the base positions and normals once for all morphs, shape keys are relative to the basis
+        base_positions = vertex_positions(geom_mesh)
+        if self.do_import_shape_keys and geom_mesh.shape_keys is not None:
+            base_positions = shape_key_positions(geom_mesh.shape_keys.reference_key)
+        base_normals = vertex_normals(geom_mesh)
+
+        # Decode all selected morphs at once
+        directory = os.path.dirname(self.filepath)
+        filepaths = [os.path.join(directory, geom_file.name) for geom_file in self.files]
+        morph_data = MorphLoader.readMorphs(filepaths)
+
+        morph_count = self.get_morph_count(geom_obj)
+        imported = []
+        for filepath in filepaths:
+            morph_geomdata = morph_data[filepath]
+            if isinstance(morph_geomdata, Exception):
+                self.report({'ERROR'}, f"Failed to read {filepath}: {morph_geomdata}")
+                continue
+
+            if morph_geomdata.vertex_count != len(geom_mesh.vertices):
                 self.report({'ERROR'}, "Vertex count mismatch, can't import morphs")
                 continue
             
             # Name the morph
             filename = os.path.split(filepath)[1].lower()
-            morphcount = self.get_morph_count(geom_obj)
             morphname = f"MORPH"
             if "fat" in filename:
                 morphname = f"{morphname}_FAT"
@@ -86,54 +101,55 @@ class SIMGEOM_OT_import_morph(Operator, ImportHelper):
             elif "special" in filename:
                 morphname = f"{morphname}_SPECIAL"
             else:
-                morphname = f"{morphname}_{morphcount}"
+                morphname = f"{morphname}_{morph_count}"
+            morph_count += 1
             morph_obj_name = f"{geom_obj.name}_{morphname}"
 
             # Get final positions and normals from adding the offsets
-            morph_vertices = [[0,0,0]] * len(geom_mesh.vertices)
-            morph_normals  = [[0,0,0]] * len(geom_mesh.vertices)
-
-            for i in range(len(geom_mesh.vertices)):
-                morph_vertices[i] = [
-                    geom_mesh.vertices[i].co[0] + morph_geomdata.element_data[i].position[0],
-                    geom_mesh.vertices[i].co[1] - morph_geomdata.element_data[i].position[2],
-                    geom_mesh.vertices[i].co[2] + morph_geomdata.element_data[i].position[1]
-                ]
-                morph_normals[i] = [
-                    geom_normals[i][0] + morph_geomdata.element_data[i].normal[0],
-                    geom_normals[i][1] - morph_geomdata.element_data[i].normal[2],
-                    geom_normals[i][2] + morph_geomdata.element_data[i].normal[1]
-                ]
+            vertices = morph_geomdata.vertex_buffer
+            morph_vertices = MorphLoader.applyDeltas(base_positions, vertices.position)
+
+            # Shape keys only store positions, the file's normal offsets are kept on the object for export
+            if self.do_import_shape_keys:
+                key = set_shape_key(geom_obj, morphname, morph_vertices)
+                if vertices.normal is not None:
+                    set_shape_key_normals(geom_obj, key, vertices.normal)
+                self.report({'INFO'}, "Imported Morph: " + morphname + " For Object: " + geom_obj.name)
+                continue
             
-            faces = morph_geomdata.faces
             mesh  = bpy.data.meshes.new(morph_obj_name)
             obj   = bpy.data.objects.new(morph_obj_name, mesh)
-            mesh.from_pydata(morph_vertices, [], faces)
+            add_vertices(mesh, morph_vertices)
+            add_triangles(mesh, morph_geomdata.faces)
 
             # Shade smooth before applying custom normals
-            for poly in mesh.polygons:
-                poly.use_smooth = True
+            set_smooth(mesh)
 
             # Add custom split normals layer if enabled
-            if self.do_import_normals:
-                mesh.normals_split_custom_set_from_vertices(morph_normals)
+            if self.do_import_normals and vertices.normal is not None:
+                morph_normals = MorphLoader.applyDeltas(base_normals, vertices.normal)
+                mesh.normals_split_custom_set_from_vertices( np.reshape(morph_normals, (-1, 3)) )
                 mesh.use_auto_smooth = True
 
-            # Link the newly created object to the active collection
-            context.view_layer.active_layer_collection.collection.objects.link(obj)
-
-            # Deselect everything but newly imported mesh, then make it the active object
-            for o in context.selected_objects:
-                o.select_set(False)
-            obj.select_set(True)
-            bpy.context.view_layer.objects.active = obj
-
             # Custom Properties
             obj['__GEOM_MORPH__'] = 1
             obj.morph_name = morphname
             obj.morph_link = geom_obj
+            imported.append(obj)
+
+        # Link the new objects to the active collection, the last one becomes the active object
+        collection = context.view_layer.active_layer_collection.collection
+        for obj in imported:
+            collection.objects.link(obj)
+        if imported:
+            for o in context.selected_objects:
+                o.select_set(False)
+            for obj in imported:
+                obj.select_set(True)
+            context.view_layer.objects.active = imported[-1]
 
-            self.report({'INFO'}, "Imported Morph: " + morphname + " For Object: " + geom_obj.name)
+        for obj in imported:
+            self.report({'INFO'}, "Imported Morph: " + obj.morph_name + " For Object: " + geom_obj.name)
         return {'FINISHED'}
 
     
@@ -148,4 +164,4 @@ class SIMGEOM_OT_import_morph(Operator, ImportHelper):
             if o.get('morph_link', None) == base_obj:
                 morphs.append(o)
         
-        return len(morphs)
+        return len(morphs) + len( morph_shape_keys(base_obj) )
@@ -0,0 +1,73 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from array                      import array
+from concurrent.futures         import ThreadPoolExecutor
+
+from io_simgeom.io.geom_load    import GeomLoader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class MorphLoader:
+    """Reads morph GEOMs, which store position and normal offsets from the base mesh"""
+
+    # Morphs only need these, anything else in the vertex block is skipped
+    COLUMNS = ('position', 'normal')
+
+
+    @staticmethod
+    def readMorphs(filepaths: list, workers: int = None) -> dict:
+        """
+        Read morph files on a thread pool, returns {filepath: Geom or the exception that was raised}.
+        Only the file reads overlap, decoding holds the GIL.
+        """
+        if not filepaths:
+            return {}
+        with ThreadPoolExecutor(max_workers=workers or min(len(filepaths), os.cpu_count() or 1)) as executor:
+            futures = {
+                filepath: executor.submit(GeomLoader.readGeomColumns, filepath, MorphLoader.COLUMNS)
+                for filepath in filepaths
+            }
+            return {
+                filepath: future.exception() or future.result()
+                for filepath, future in futures.items()
+            }
+
+
+    @staticmethod
+    def applyDeltas(base, deltas):
+        """Flat Blender space xyz base plus flat GEOM space deltas, returned in Blender space (x, -z, y)"""
+        if np is not None:
+            result = np.asarray(base, dtype=np.float32).reshape(-1, 3).copy()
+            deltas = np.asarray(deltas, dtype=np.float32).reshape(-1, 3)
+            result[:, 0] += deltas[:, 0]
+            result[:, 1] -= deltas[:, 2]
+            result[:, 2] += deltas[:, 1]
+            return result.reshape(-1)
+
+        result = array('f', base)
+        for i in range(0, len(result), 3):
+            result[i]     += deltas[i]
+            result[i + 1] -= deltas[i + 2]
+            result[i + 2] += deltas[i + 1]
+        return result
@@ -0,0 +1,108 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+from array                      import array
+from concurrent.futures         import ThreadPoolExecutor
+
+from io_simgeom.io.geom_write   import GeomWriter
+from io_simgeom.models.face     import FaceBuffer
+from io_simgeom.models.geom     import Geom
+from io_simgeom.models.vertex   import VertexBuffer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class MorphWriter:
+    """
+    Builds morph GEOMs, which store position and normal offsets from the base mesh.
+    The base mesh data, faces and bones are shared by every morph of a mesh.
+    """
+
+    EMPTY_TGI = {
+        'type': "0x0",
+        'group': "0x0",
+        'instance': "0x0"
+    }
+
+
+    @staticmethod
+    def getDeltas(base, target):
+        """target - base for flat Blender space xyz arrays, returned as flat GEOM space (x, z, -y)"""
+        if np is not None:
+            delta = np.asarray(target, dtype=np.float32).reshape(-1, 3) - np.asarray(base, dtype=np.float32).reshape(-1, 3)
+            return np.column_stack( (delta[:, 0], delta[:, 2], -delta[:, 1]) ).reshape(-1)
+
+        deltas = array('f', bytes(4 * len(base)))
+        for i in range(0, len(base), 3):
+            deltas[i]     = target[i] - base[i]
+            deltas[i + 1] = target[i + 2] - base[i + 2]
+            deltas[i + 2] = base[i + 1] - target[i + 1]
+        return deltas
+
+
+    @staticmethod
+    def buildMorph(
+        position_deltas,
+        normal_deltas,
+        faces:          FaceBuffer,
+        bones:          list,
+        vertex_ids      = None,
+        sort_order:     int = 0,
+        merge_group:    int = 0
+    ) -> Geom:
+        geom = Geom()
+        count = len(position_deltas) // 3
+        columns = {
+            'position': position_deltas,
+            'normal':   normal_deltas
+        }
+        if vertex_ids is not None:
+            columns['vertex_id'] = vertex_ids
+        geom.element_data = VertexBuffer(count, columns)
+        geom.vertex_count = count
+        geom.faces = faces
+        geom.face_count = len(faces)
+        geom.bones = bones
+
+        geom.internal_chunks = [MorphWriter.EMPTY_TGI]
+        geom.external_resources = []
+        geom.shaderdata = []
+        geom.tgi_list = [MorphWriter.EMPTY_TGI]
+        geom.sort_order = sort_order
+        geom.merge_group = merge_group
+        geom.skin_controller_index = 0
+        geom.embeddedID = "0x0"
+        return geom
+
+
+    @staticmethod
+    def writeMorphs(morphs: dict, workers: int = None) -> dict:
+        """
+        Write {filepath: Geom} on a thread pool, returns {filepath: exception or None}.
+        Only the file writes overlap, building the buffers holds the GIL.
+        """
+        if not morphs:
+            return {}
+        with ThreadPoolExecutor(max_workers=workers or min(len(morphs), 4)) as executor:
+            futures = {
+                filepath: executor.submit(GeomWriter.writeGeom, filepath, geom)
+                for filepath, geom in morphs.items()
+            }
+            return { filepath: future.exception() for filepath, future in futures.items() }
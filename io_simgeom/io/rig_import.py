@@ -16,14 +16,16 @@
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
 import bpy
+import bmesh
 import os
 
-from mathutils              import Vector, Quaternion
+from mathutils              import Matrix
 from bpy_extras.io_utils    import ImportHelper
 from bpy.props              import StringProperty, BoolProperty, EnumProperty
 from bpy.types              import Operator
 
 from io_simgeom.io.rig_load     import RigLoader
+from io_simgeom.models.skeleton import Skeleton
 from io_simgeom.util.globals    import Globals
 
 class SIMGEOM_OT_import_rig(Operator, ImportHelper):
@@ -40,85 +42,98 @@ class SIMGEOM_OT_import_rig(Operator, ImportHelper):
             options={'HIDDEN'},
             maxlen=255,  # Max internal buffer length, longer would be clamped.
             )
+    reuse_existing: BoolProperty(
+        name = "Reuse Existing",
+        description = "Don't build the rig again when the scene already contains it",
+        default = False
+    )
 
     def execute(self, context):
         if not os.path.exists(self.filepath):
             return {'CANCELLED'}
 
-        context.view_layer.active_layer_collection = context.view_layer.layer_collection.children[-1]
         rigdata = RigLoader.loadRig(self.filepath)
 
+        context.view_layer.active_layer_collection = context.view_layer.layer_collection.children[-1]
+
+        if self.reuse_existing and self.find_rig(context, rigdata['name']) is not None:
+            self.report({'INFO'}, f"Using the {rigdata['name']} rig already in the scene")
+            return {'FINISHED'}
+
         rigthing = bpy.data.armatures.new(name=rigdata['name'])
         rig = bpy.data.objects.new(rigdata['name'], rigthing)
 
         context.scene.collection.children[-1].objects.link(rig)
         rig.select_set(True)
         bpy.context.view_layer.objects.active = rig
-        bpy.ops.object.mode_set(mode='EDIT')
         rig.show_in_front = True
 
-        # Import bones to placeholder location and set parents
-        for i, b in enumerate(rigdata['bones']):
+        # Bones are placed from their world space rest matrices in a single edit session
+        matrices = self.world_matrices(rigdata)
+        bpy.ops.object.mode_set(mode='EDIT')
+        edit_bones = []
+        for b, matrix in zip(rigdata['bones'], matrices):
             bone = rig.data.edit_bones.new(b['name'])
-            pos = Quaternion(b['rotation']) @ Vector(b['position'])
-            par = b['parent_index']
-            if par >= 0:
-                bone.parent = rig.data.edit_bones[par]
             bone.use_connect = False
             bone.use_deform = True
             bone.use_inherit_rotation = True
+            bone.use_local_location = True
+
+            # The bone's length follows its scale, the matrix only sets position and orientation
+            length = 0.01 * matrix.to_3x3().col[1].length
             bone.head = 0,0,0
-            bone.tail = 0,0.01,0
-            bone.use_local_location = False
-
-        # Move the bones to their proper locations in pose mode
-        bpy.ops.object.mode_set(mode='POSE')
-        for i in range(len(rig.pose.bones)):
-            bone = rig.pose.bones[i]
-            pos = Vector((
-                rigdata['bones'][i]['position'][0], 
-                rigdata['bones'][i]['position'][1], 
-                rigdata['bones'][i]['position'][2]
-                ))
-            rot = Quaternion((
-                rigdata['bones'][i]['rotation'][0],
-                rigdata['bones'][i]['rotation'][1],
-                rigdata['bones'][i]['rotation'][2],
-                rigdata['bones'][i]['rotation'][3]
-                ))
-            scale = Vector((
-                rigdata['bones'][i]['scale'][0], 
-                rigdata['bones'][i]['scale'][1], 
-                rigdata['bones'][i]['scale'][2]
-                ))
-            bone.location = pos
-            bone.rotation_quaternion = rot
-            bone.scale = scale
-        bpy.ops.pose.armature_apply()
+            bone.tail = 0,max(length, 0.0001),0
+            bone.matrix = matrix.normalized()
+            edit_bones.append(bone)
 
-        bpy.ops.object.mode_set(mode='EDIT')
-        for i in rig.data.edit_bones:
-            i.use_local_location = True
+        for bone, b in zip(edit_bones, rigdata['bones']):
+            if b['parent_index'] >= 0:
+                bone.parent = edit_bones[b['parent_index']]
+        bpy.ops.object.mode_set(mode='OBJECT')
 
         # Rotate to Z=up
-        bpy.ops.object.mode_set(mode='OBJECT')            
         rig.rotation_euler = 1.5707963705062866,0,0
 
         # Custom bone shape
         # Only create it if it does not exist, use existing one otherwise
         boneshape = bpy.data.objects.get('rig_boneshape', None)
         if boneshape == None:
-            bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=1,radius=1)
-            boneshape = bpy.context.active_object
-            boneshape.data.name = boneshape.name = "rig_boneshape"
-            bpy.context.scene.collection.children[-1].objects.unlink(boneshape) # don't want the user deleting this
-
-        bpy.context.view_layer.objects.active = rig
-        bpy.ops.object.mode_set(mode='POSE')
+            boneshape = self.create_boneshape()
         for bone in rig.pose.bones:
             bone.custom_shape = boneshape # apply bone shape
-        bpy.ops.object.mode_set(mode='OBJECT')
 
         rig['__S3_RIG__'] = 1
+        rig['rig_name'] = rigdata['name']
 
         return {'FINISHED'}
+    
+
+    def world_matrices(self, rigdata: dict) -> list:
+        """Armature space rest matrix of every bone, parent @ translation @ rotation @ scale"""
+        world = Skeleton.fromRig(rigdata).getWorldMatrices()
+        return [Matrix(m) for m in world]
+    
+
+    def create_boneshape(self):
+        """Icosphere used as custom bone shape, not linked to the scene so the user can't delete it"""
+        mesh = bpy.data.meshes.new("rig_boneshape")
+        bm = bmesh.new()
+        try:
+            bmesh.ops.create_icosphere(bm, subdivisions=1, radius=1)
+        except TypeError:
+            # Blender before 3.0 calls the radius diameter
+            bmesh.ops.create_icosphere(bm, subdivisions=1, diameter=1)
+        bm.to_mesh(mesh)
+        bm.free()
+        return bpy.data.objects.new("rig_boneshape", mesh)
+    
+
+    def find_rig(self, context, name: str):
+        """Armature in the scene that was imported from the rig with this name"""
+        for ob in context.scene.objects:
+            if ob.type != 'ARMATURE' or not ob.get('__S3_RIG__'):
+                continue
+            # Rigs imported before rig_name was stored only have the name on their armature
+            if ob.get('rig_name', ob.data.name) == name:
+                return ob
+        return None
@@ -15,18 +15,60 @@
 # You should have received a copy of the GNU General Public License
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import threading
+
+from array                          import array
+
 from io_simgeom.util.bytereader     import ByteReader
 from io_simgeom.util.globals        import Globals as gb
 
 
 class RigLoader:
+    """
+    Reads .grannyrig skeletons into {'name', 'bones'} dicts.
+
+    Next to the per bone dicts a rig holds its data as packed arrays for bulk use:
+    positions (xyz), rotations (wxyz) and scales (xyz) as flat float arrays,
+    parents and mirrors as int arrays, hashes as uint32 and name_index mapping bone names to indices.
+    """
+
+    # Parsed rigs by absolute path, (mtime, size, rig), shared by everything in the process
+    _cache:         dict                = {}
+    _cache_lock:    threading.Lock      = threading.Lock()
 
 
     @staticmethod
-    def loadRig(filepath: str) -> dict:
-        with open(filepath, "rb") as f:
-            return RigLoader.rigFromData(f.read())
+    def loadRig(filepath: str, cache: bool = True) -> dict:
+        """
+        Load a rig, cached rigs are reused for as long as the file is unchanged.
+        A cached rig is shared, so it must not be modified.
+        """
+        if not cache:
+            with open(filepath, "rb") as f:
+                return RigLoader.rigFromData(f.read())
+
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with RigLoader._cache_lock:
+            entry = RigLoader._cache.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        with open(path, "rb") as f:
+            rig = RigLoader.rigFromData(f.read())
+        with RigLoader._cache_lock:
+            RigLoader._cache[path] = (key, rig)
+        return rig
     
+
+    @staticmethod
+    def clearCache():
+        with RigLoader._cache_lock:
+            RigLoader._cache.clear()
+    
+
     @staticmethod
     def rigFromData(rigdata: bytes) -> dict:
         reader = ByteReader(rigdata)
@@ -36,45 +78,50 @@ class RigLoader:
         reader.skip(8)
         bonecount = reader.getUint32()
 
+        positions   = array('f')
+        rotations   = array('f')
+        scales      = array('f')
+        mirrors     = array('i')
+        parents     = array('i')
+        hashes      = array('I')
         for _ in range(bonecount):
-            bone = {}
-            # Position
-            px = reader.getFloat()
-            py = reader.getFloat()
-            pz = reader.getFloat()
-            bone['position'] = (px, py, pz)
-
-            # Rotation
-            rx = reader.getFloat()
-            ry = reader.getFloat()
-            rz = reader.getFloat()
-            rw = reader.getFloat()
-            bone['rotation'] = (rw, rx, ry, rz)
-
-            # Scale
-            sx = reader.getFloat()
-            sy = reader.getFloat()
-            sz = reader.getFloat()
-            bone['scale'] = (sx, sy, sz)
-
-            # Bone Name
-            bone['name'] = reader.getString( reader.getInt32() )
-
-            # Mirror Index
-            bone['mirror_index'] = reader.getInt32()
-
-            # Parent Index
-            bone['parent_index'] = reader.getInt32()
-
-            # Bone Hash
-            bone['namehash'] = hex(reader.getUint32())
-
-            # Bone Flags
-            bone['flags'] = hex(reader.getUint32())
-
-            rig['bones'].append(bone)
+            # Position, rotation as xyzw, scale
+            px, py, pz, rx, ry, rz, rw, sx, sy, sz = reader.getStruct('10f')
+            name = reader.getString( reader.getInt32() )
+            mirror_index, parent_index, namehash, flags = reader.getStruct('iiII')
+
+            rig['bones'].append({
+                'position':     (px, py, pz),
+                'rotation':     (rw, rx, ry, rz),
+                'scale':        (sx, sy, sz),
+                'name':         name,
+                'mirror_index': mirror_index,
+                'parent_index': parent_index,
+                'namehash':     hex(namehash),
+                'flags':        hex(flags)
+            })
+            positions.extend( (px, py, pz) )
+            rotations.extend( (rw, rx, ry, rz) )
+            scales.extend( (sx, sy, sz) )
+            mirrors.append(mirror_index)
+            parents.append(parent_index)
+            hashes.append(namehash)
         
         # Skeleton Name
         rig['name'] = reader.getString( reader.getUint32() )
 
+        rig['positions']    = positions
+        rig['rotations']    = rotations
+        rig['scales']       = scales
+        rig['mirrors']      = mirrors
+        rig['parents']      = parents
+        rig['hashes']       = hashes
+        rig['name_index']   = { bone['name']: i for i, bone in enumerate(rig['bones']) }
+
         return rig
+    
+
+    @staticmethod
+    def toDict(rig: dict) -> dict:
+        """The plain {'name', 'bones'} part of a rig, as written to JSON"""
+        return {'name': rig['name'], 'bones': rig['bones']}
@@ -0,0 +1,36 @@
+from collections.abc    import Sequence
+from typing             import List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class FaceBuffer(Sequence):
+    """
+    Packed triangle index buffer, stored as a flat array of unsigned shorts.
+    Indexing returns the 3 vertex indices of a face, so it can be used wherever a List[List[int]] was.
+    """
+
+
+    def __init__(self, indices: Sequence):
+        self.indices: Sequence = indices
+    
+    def __len__(self) -> int:
+        return len(self.indices) // 3
+    
+    def __getitem__(self, index) -> List[int]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Face index out of range")
+        return self.indices[index*3:index*3 + 3].tolist()
+    
+    def asArray(self):
+        """(N, 3) NumPy view of the indices without copying, the FaceBuffer itself if NumPy is not available"""
+        if np is None:
+            return self
+        return np.asarray(self.indices).reshape(-1, 3)
@@ -1,6 +1,7 @@
-from typing import List
+from typing import Callable, List
 
-from io_simgeom.models.vertex import Vertex
+from io_simgeom.models.face   import FaceBuffer
+from io_simgeom.models.vertex import Vertex, VertexBuffer
 
 
 class Geom:
@@ -18,6 +19,71 @@ class Geom:
         self.skin_controller_index: int             = None
         self.tgi_list:              List[dict]      = None
         self.shaderdata:            List[dict]      = None
-        self.element_data:          List[Vertex]    = None
         self.bones:                 List[str]       = None
-        self.faces:                 List[List[int]] = None
+
+        # Geometry layout, known without decoding the geometry itself
+        self.vertex_count:          int             = None
+        self.face_count:            int             = None
+        self.element_layout:        List[dict]      = None
+        self.vertex_offset:         int             = None
+        self.index_offset:          int             = None
+
+        self._vertex_buffer:        VertexBuffer    = None
+        self._element_data:         List[Vertex]    = None
+        self._faces:                FaceBuffer      = None
+
+        # Deferred decoders for lazily loaded attributes, called on first access
+        self._loaders:              dict            = {}
+    
+
+    def setLoader(self, name: str, loader: Callable):
+        """Decode attribute 'vertex_buffer' or 'faces' with loader() the first time it is accessed"""
+        self._loaders[name] = loader
+    
+
+    def isLoaded(self, name: str) -> bool:
+        return name not in self._loaders
+    
+
+    @property
+    def vertex_buffer(self) -> VertexBuffer:
+        if 'vertex_buffer' in self._loaders:
+            self._vertex_buffer = self._loaders.pop('vertex_buffer')()
+        return self._vertex_buffer
+    
+
+    @vertex_buffer.setter
+    def vertex_buffer(self, value: VertexBuffer):
+        self._loaders.pop('vertex_buffer', None)
+        self._vertex_buffer = value
+    
+
+    @property
+    def faces(self):
+        if 'faces' in self._loaders:
+            self._faces = self._loaders.pop('faces')()
+        return self._faces
+    
+
+    @faces.setter
+    def faces(self, value):
+        self._loaders.pop('faces', None)
+        self._faces = value
+    
+
+    @property
+    def element_data(self):
+        """List[Vertex] when set from one, otherwise lazy views into the vertex buffer"""
+        if self._element_data is None:
+            return self.vertex_buffer
+        return self._element_data
+    
+
+    @element_data.setter
+    def element_data(self, value):
+        if isinstance(value, VertexBuffer):
+            self.vertex_buffer = value
+            self._element_data = None
+        else:
+            self.vertex_buffer = None
+            self._element_data = value
@@ -0,0 +1,204 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+from array          import array
+from typing         import List, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Skeleton:
+    """
+    Grannyrig skeleton with its bones in packed arrays, usable without Blender.
+
+    Matrices are 4x4 for column vectors, like mathutils, translation in the last column.
+    They are (N, 4, 4) NumPy arrays, or lists of row lists when NumPy is not available.
+    """
+
+
+    def __init__(
+        self,
+        name:       str,
+        names:      List[str],
+        parents:    Sequence,
+        positions:  Sequence,
+        rotations:  Sequence,
+        scales:     Sequence,
+        mirrors:    Sequence    = None,
+        hashes:     Sequence    = None
+    ):
+        self.name:          str         = name
+        self.names:         List[str]   = names
+        self.parents:       Sequence    = parents       # parent index per bone, -1 for roots
+        self.positions:     Sequence    = positions     # flat xyz
+        self.rotations:     Sequence    = rotations     # flat wxyz quaternions
+        self.scales:        Sequence    = scales        # flat xyz
+        self.mirrors:       Sequence    = mirrors if mirrors is not None else array('i', range(len(names)))
+        self.hashes:        Sequence    = hashes if hashes is not None else array('I', [0] * len(names))
+        self.name_index:    dict        = { name: i for i, name in enumerate(names) }
+
+
+    @staticmethod
+    def fromRig(rig: dict) -> 'Skeleton':
+        """Skeleton of a rig dict as returned by RigLoader"""
+        return Skeleton(
+            rig['name'],
+            [bone['name'] for bone in rig['bones']],
+            rig['parents'],
+            rig['positions'],
+            rig['rotations'],
+            rig['scales'],
+            rig['mirrors'],
+            rig['hashes']
+        )
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def getLevels(self) -> List[List[int]]:
+        """Bone indices grouped by depth, every bone comes after its parent"""
+        count = len(self)
+        children = [[] for _ in range(count)]
+        level = []
+        for i, parent in enumerate(self.parents):
+            if parent < 0:
+                level.append(i)
+            elif parent < count:
+                children[parent].append(i)
+            else:
+                raise ValueError(f"Bone {self.names[i]} has parent index {parent} out of range")
+
+        levels = []
+        visited = 0
+        while level:
+            levels.append(level)
+            visited += len(level)
+            level = [child for i in level for child in children[i]]
+        if visited != count:
+            raise ValueError("Skeleton has a parent cycle")
+        return levels
+
+
+    def getOrder(self) -> List[int]:
+        """Topological bone order, parents first"""
+        return [i for level in self.getLevels() for i in level]
+
+
+    def getMirrorPairs(self) -> List[tuple]:
+        """(left, right) bone index pairs that mirror each other, each pair once with the lower index first"""
+        pairs = []
+        for i, mirror in enumerate(self.mirrors):
+            if i < mirror < len(self) and self.mirrors[mirror] == i:
+                pairs.append( (i, mirror) )
+        return pairs
+
+
+    def getBindPose(self) -> tuple:
+        """World matrices and their inverses, the inverse bind matrices, in one parent-first pass"""
+        if np is None:
+            return self._getBindPoseList()
+
+        count = len(self)
+        pos = np.asarray(self.positions, dtype=np.float64).reshape(count, 3)
+        quat = np.asarray(self.rotations, dtype=np.float64).reshape(count, 4)
+        scale = np.asarray(self.scales, dtype=np.float64).reshape(count, 3)
+        parents = np.asarray(self.parents, dtype=np.int64)
+
+        rot = Skeleton.quaternionsToMatrices(quat)
+
+        # local = T @ R @ S, inverse local = S^-1 @ R^T @ T^-1
+        local = np.zeros( (count, 4, 4) )
+        local[:, :3, :3] = rot * scale[:, None, :]
+        local[:, :3, 3] = pos
+        local[:, 3, 3] = 1.0
+
+        with np.errstate(divide='ignore'):
+            inv_scale = np.where(scale != 0, 1.0 / scale, 0.0)
+        inv_rot = np.transpose(rot, (0, 2, 1)) * inv_scale[:, :, None]
+        inv_local = np.zeros( (count, 4, 4) )
+        inv_local[:, :3, :3] = inv_rot
+        inv_local[:, :3, 3] = -np.einsum('nij,nj->ni', inv_rot, pos)
+        inv_local[:, 3, 3] = 1.0
+
+        world = local.copy()
+        inverse = inv_local.copy()
+        for level in self.getLevels()[1:]:
+            level = np.asarray(level, dtype=np.int64)
+            world[level] = np.matmul( world[parents[level]], local[level] )
+            inverse[level] = np.matmul( inv_local[level], inverse[parents[level]] )
+        return world, inverse
+
+
+    def getWorldMatrices(self):
+        return self.getBindPose()[0]
+
+
+    def getInverseBindMatrices(self):
+        return self.getBindPose()[1]
+
+
+    @staticmethod
+    def quaternionsToMatrices(quat: 'np.ndarray') -> 'np.ndarray':
+        """(N, 4) wxyz unit quaternions to (N, 3, 3) rotation matrices"""
+        w, x, y, z = quat[:, 0], quat[:, 1], quat[:, 2], quat[:, 3]
+        return np.stack([
+            np.stack([1 - 2*(y*y + z*z), 2*(x*y - w*z),     2*(x*z + w*y)],     axis=-1),
+            np.stack([2*(x*y + w*z),     1 - 2*(x*x + z*z), 2*(y*z - w*x)],     axis=-1),
+            np.stack([2*(x*z - w*y),     2*(y*z + w*x),     1 - 2*(x*x + y*y)], axis=-1)
+        ], axis=1)
+
+
+    def _getBindPoseList(self) -> tuple:
+        count = len(self)
+        world = [None] * count
+        inverse = [None] * count
+        for i in self.getOrder():
+            px, py, pz = self.positions[3*i:3*i + 3]
+            w, x, y, z = self.rotations[4*i:4*i + 4]
+            scale = self.scales[3*i:3*i + 3]
+            inv_scale = [1.0 / s if s != 0 else 0.0 for s in scale]
+            rot = [
+                [1 - 2*(y*y + z*z), 2*(x*y - w*z),     2*(x*z + w*y)],
+                [2*(x*y + w*z),     1 - 2*(x*x + z*z), 2*(y*z - w*x)],
+                [2*(x*z - w*y),     2*(y*z + w*x),     1 - 2*(x*x + y*y)]
+            ]
+
+            local = [ [rot[r][c] * scale[c] for c in range(3)] + [(px, py, pz)[r]] for r in range(3) ]
+            local.append([0.0, 0.0, 0.0, 1.0])
+            inv_rot = [ [rot[c][r] * inv_scale[r] for c in range(3)] for r in range(3) ]
+            inv_local = [
+                inv_rot[r] + [-(inv_rot[r][0] * px + inv_rot[r][1] * py + inv_rot[r][2] * pz)]
+                for r in range(3)
+            ]
+            inv_local.append([0.0, 0.0, 0.0, 1.0])
+
+            parent = self.parents[i]
+            if parent < 0:
+                world[i], inverse[i] = local, inv_local
+            else:
+                world[i] = _matmul(world[parent], local)
+                inverse[i] = _matmul(inv_local, inverse[parent])
+        return world, inverse
+
+
+def _matmul(a: list, b: list) -> list:
+    return [ [sum(a[r][k] * b[k][c] for k in range(4)) for c in range(4)] for r in range(4) ]
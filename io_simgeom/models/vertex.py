@@ -1,8 +1,28 @@
-from typing import List
+from array              import array
+from collections.abc    import Sequence
+from typing             import List
+
+
+# GEOM vertex element datatypes mapped to their attribute, components and array typecode
+# http://simswiki.info/wiki.php?title=Sims_3:0x015A1849
+ELEMENT_TYPES = {
+    1:  ('position',    3, 'f'),
+    2:  ('normal',      3, 'f'),
+    3:  ('uv',          2, 'f'),
+    4:  ('assignment',  4, 'B'),
+    5:  ('weights',     4, 'f'),
+    6:  ('tangent',     3, 'f'),
+    7:  ('tagvalue',    4, 'B'),
+    10: ('vertex_id',   1, 'I'),
+}
 
 
 class Vertex:
-    
+    __slots__ = (
+        'position', 'normal', 'uv', 'assignment',
+        'weights', 'tangent', 'tagvalue', 'vertex_id'
+    )
+
 
     def __init__(self):
         self.position:      List[float]         = None
@@ -13,3 +33,112 @@ class Vertex:
         self.tangent:       List[float]         = None
         self.tagvalue:      List[int]           = None
         self.vertex_id:     List[int]           = None
+
+
+class VertexBuffer(Sequence):
+    """
+    Packed vertex storage, one contiguous array per attribute and one per UV layer.
+    Indexing returns a VertexView, so it can be used wherever a List[Vertex] was.
+    """
+
+
+    def __init__(self, count: int, columns: dict):
+        self.count:         int         = count
+        self.position:      Sequence    = columns.get('position')
+        self.normal:        Sequence    = columns.get('normal')
+        self.uv:            List        = columns.get('uv')
+        self.assignment:    Sequence    = columns.get('assignment')
+        self.weights:       Sequence    = columns.get('weights')
+        self.tangent:       Sequence    = columns.get('tangent')
+        self.tagvalue:      Sequence    = columns.get('tagvalue')
+        self.vertex_id:     Sequence    = columns.get('vertex_id')
+    
+    @staticmethod
+    def fromVertices(vertices: List[Vertex]) -> 'VertexBuffer':
+        """Pack a list of Vertex objects, the first vertex decides which attributes are present"""
+        if isinstance(vertices, VertexBuffer):
+            return vertices
+
+        columns = {}
+        if vertices:
+            first = vertices[0]
+            for name, _width, typecode in ELEMENT_TYPES.values():
+                value = getattr(first, name)
+                if not value:
+                    continue
+                if name == 'uv':
+                    columns['uv'] = [
+                        array(typecode, [c for v in vertices for c in v.uv[layer]])
+                        for layer in range(len(value))
+                    ]
+                else:
+                    columns[name] = array(typecode, [c for v in vertices for c in getattr(v, name)])
+
+        return VertexBuffer(len(vertices), columns)
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [VertexView(self, i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("Vertex index out of range")
+        return VertexView(self, index)
+    
+    def __iter__(self):
+        return (VertexView(self, i) for i in range(self.count))
+
+
+class _Element:
+    """Reads and writes one vertex's slice of a VertexBuffer column"""
+
+
+    def __init__(self, width: int):
+        self.width = width
+    
+    def __set_name__(self, owner, name: str):
+        self.name = name
+    
+    def __get__(self, view, owner):
+        if view is None:
+            return self
+        column = getattr(view.buffer, self.name)
+        if column is None:
+            return None
+        start = view.index * self.width
+        if self.name == 'uv':
+            return [layer[start:start + self.width].tolist() for layer in column]
+        return column[start:start + self.width].tolist()
+    
+    def __set__(self, view, value):
+        column = getattr(view.buffer, self.name)
+        start = view.index * self.width
+        if self.name == 'uv':
+            for layer, uv in zip(column, value):
+                for i, val in enumerate(uv):
+                    layer[start + i] = val
+        else:
+            for i, val in enumerate(value):
+                column[start + i] = val
+
+
+class VertexView:
+    """Lightweight Vertex lookalike backed by a VertexBuffer"""
+    __slots__ = ('buffer', 'index')
+
+    position    = _Element(3)
+    normal      = _Element(3)
+    uv          = _Element(2)
+    assignment  = _Element(4)
+    weights     = _Element(4)
+    tangent     = _Element(3)
+    tagvalue    = _Element(4)
+    vertex_id   = _Element(1)
+
+
+    def __init__(self, buffer: VertexBuffer, index: int):
+        self.buffer = buffer
+        self.index  = index
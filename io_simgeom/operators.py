@@ -16,7 +16,6 @@
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
 import bpy
-import mathutils
 
 from bpy_extras.io_utils    import ExportHelper
 from bpy.props              import StringProperty, BoolProperty, EnumProperty
@@ -24,6 +23,7 @@ from bpy.types              import Operator
 
 from io_simgeom.util.fnv        import fnv32
 from io_simgeom.util.globals    import Globals
+from io_simgeom.util.vertexids  import calc_vertex_ids, clear_vertex_ids, count_unique, get_vertex_ids, set_vertex_ids
 
 
 class SIMGEOM_OT_rebuild_bone_database(bpy.types.Operator):
@@ -47,9 +47,9 @@ class SIMGEOM_OT_rebuild_bone_database(bpy.types.Operator):
 
         
         bonedict = { hex(fnv32(bone.name)): bone.name for bone in ob.data.bones }
-        Globals.rebuild_fnv_database(bonedict)
+        added = Globals.rebuild_fnv_database(bonedict)
 
-        message = f'Rebuilt bonehash database for rig: {ob.name}'
+        message = f'Rebuilt bonehash database for rig: {ob.name}, {added} new bones'
         self.report({'INFO'}, message)
 
         return {"FINISHED"}
@@ -144,7 +144,9 @@ class SIMGEOM_OT_copy_data(bpy.types.Operator):
             self.report({'ERROR'}, "Active object must have valid GEOM data to transfer to selected objects")
             return {'CANCELLED'}
         
+        vertex_ids = get_vertex_ids(active)
         n_copied = 0
+        n_without_ids = 0
         for o in selected:
             if o == active:
                 continue
@@ -153,13 +155,22 @@ class SIMGEOM_OT_copy_data(bpy.types.Operator):
             for prop in o.id_data.keys():
                 del o[prop]
             
-            # Copy new properties
+            # Copy new properties, vertex IDs only carry over to meshes with the same vertex count
+            # and stored morph normals belong to the active object's shape keys
             for prop in active.id_data.keys():
-                o[prop] = active[prop]
+                if prop not in ('vertex_ids', 'vertex_id_count', 'vert_ids', 'morph_normals'):
+                    o[prop] = active[prop]
+            if vertex_ids is not None and len(vertex_ids) == len(o.data.vertices):
+                set_vertex_ids(o, vertex_ids)
+            else:
+                n_without_ids += 1
             
             n_copied += 1
 
-        self.report({'INFO'}, f"Transfered GEOM data to {n_copied} objects.")
+        message = f"Transfered GEOM data to {n_copied} objects."
+        if n_without_ids:
+            message += f" {n_without_ids} of them need their vertex IDs recalculated."
+        self.report({'INFO'}, message)
 
         return {'FINISHED'}
 
@@ -179,7 +190,7 @@ class SIMGEOM_OT_remove_ids(bpy.types.Operator):
             self.report({'ERROR'}, message)
             return {"CANCELLED"}
         
-        ob['vert_ids'] = {}
+        clear_vertex_ids(ob)
         
         message = "Removed all vertex IDs."
         self.report({'INFO'}, message)
@@ -214,35 +225,19 @@ class SIMGEOM_OT_recalc_ids(bpy.types.Operator):
         start_id = ob.get('start_id')
         mesh = ob.data
         
-        # Set up the KDTree
-        kd = mathutils.kdtree.KDTree(len(mesh.vertices))
-        for i, v in enumerate(mesh.vertices):
-            kd.insert(v.co, i)
-        kd.balance()
-
+        # Group vertices whose positions match within the given distance
         distance = context.scene.get('v_id_margin', 0.00001)
-        vertex_sets = []
-        for v in mesh.vertices:
-            # Skip vertices already handled previously(in same position as another one)
-            if any(v.index in sublist for sublist in vertex_sets):
-                continue
-
-            # Group vertices(idices) together when position matches with given distance
-            # TODO: make distance user changeable
-            vset = kd.find_range(v.co, distance)
-            vset = [vert[1] for vert in vset]
-            vertex_sets.append(vset)
+        positions = [0.0] * (len(mesh.vertices) * 3)
+        mesh.vertices.foreach_get('co', positions)
+        vertex_ids = calc_vertex_ids(positions, distance, start_id)
         
         # TODO: Arrange by sets of matching normals from sets of matching positions?
         # Check more EA meshes first, if they all match in ID counts don't bother
 
         # Save the resulting vertex ID map to the GEOM data of the object
-        ids = dict()
-        for i, indices in enumerate(vertex_sets):
-            ids[hex(i + start_id)] = indices
-        ob['vert_ids'] = ids
+        set_vertex_ids(ob, vertex_ids)
 
-        message = f"Assigned {len(vertex_sets)} unique vertex IDs to {len(mesh.vertices)} vertices."
+        message = f"Assigned {count_unique(vertex_ids)} unique vertex IDs to {len(mesh.vertices)} vertices."
         self.report({'INFO'}, message)
 
         return {'FINISHED'}
@@ -17,6 +17,7 @@
 
 import bpy
 from io_simgeom.util.globals      import Globals
+from io_simgeom.util.vertexids    import get_unique_count
 
 
 class SIMGEOM_PT_utility_panel(bpy.types.Panel):
@@ -90,7 +91,7 @@ class SIMGEOM_PT_utility_panel(bpy.types.Panel):
         row.prop(obj, '["start_id"]')
         sub = row.row()
         sub.alignment = 'RIGHT'
-        uniques = len(obj.get('vert_ids'))
+        uniques = get_unique_count(obj)
         sub.label( text = "end_id: " + str( obj.get('start_id') + uniques ) + " (" + str(uniques) + " total)" )
         col.operator("simgeom.recalc_ids", text="Recalculate IDs")
         col.operator("simgeom.remove_ids", text="Remove IDs")
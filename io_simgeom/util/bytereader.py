@@ -16,13 +16,35 @@
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
 import struct
+import sys
+
+from array import array
+
+
+# Precompiled little endian formats, all GEOM and rig data is little endian
+INT16   = struct.Struct('<h')
+UINT16  = struct.Struct('<H')
+INT32   = struct.Struct('<i')
+UINT32  = struct.Struct('<I')
+INT64   = struct.Struct('<q')
+UINT64  = struct.Struct('<Q')
+FLOAT   = struct.Struct('<f')
+
+# array.array always uses the native byte order
+BIG_ENDIAN = sys.byteorder == 'big'
 
 
 class ByteReader:
+    """Reads little endian values from any bytes-like object without copying it"""
 
     def __init__(self, data):
-        self.data = data
+        self.data = memoryview(data)
         self.offset = 0
+        self._structs = {}
+    
+    def release(self):
+        """Release the underlying memoryview, required before closing an mmap"""
+        self.data.release()
     
     def skip(self, bytes_to_skip: int):
         self.offset += bytes_to_skip
@@ -38,53 +60,72 @@ class ByteReader:
         self.offset += 1
         return byte
     
+    def _unpack(self, st: struct.Struct):
+        value = st.unpack_from(self.data, self.offset)[0]
+        self.offset += st.size
+        return value
+    
     def getInt16(self) -> int:
-        bytes = bytearray()
-        for _ in range(2):
-            bytes.append(self.getByte())
-        return struct.unpack('<h', bytes)[0]
+        return self._unpack(INT16)
     
     def getUint16(self) -> int:
-        bytes = bytearray()
-        for _ in range(2):
-            bytes.append(self.getByte())
-        return struct.unpack('<H', bytes)[0]
+        return self._unpack(UINT16)
     
     def getInt32(self) -> int:
-        bytes = bytearray()
-        for _ in range(4):
-            bytes.append(self.getByte())
-        return struct.unpack('<i', bytes)[0]
+        return self._unpack(INT32)
     
     def getUint32(self) -> int:
-        bytes = bytearray()
-        for _ in range(4):
-            bytes.append(self.getByte())
-        return struct.unpack('<I', bytes)[0]
+        return self._unpack(UINT32)
     
     def getInt64(self) -> int:
-        bytes = bytearray()
-        for _ in range(8):
-            bytes.append(self.getByte())
-        return struct.unpack('<q', bytes)[0]
+        return self._unpack(INT64)
     
     def getUint64(self) -> int:
-        bytes = bytearray()
-        for _ in range(8):
-            bytes.append(self.getByte())
-        return struct.unpack('<Q', bytes)[0]
+        return self._unpack(UINT64)
     
     def getFloat(self) -> float:
-        bytes = bytearray()
-        for _ in range(4):
-            bytes.append(self.getByte())
-        return struct.unpack('<f', bytes)[0]
+        return self._unpack(FLOAT)
+    
+    def getStruct(self, fmt: str) -> tuple:
+        """Unpack a struct format string at the current offset, little endian unless specified"""
+        st = self._structs.get(fmt)
+        if st is None:
+            st = struct.Struct(fmt if fmt[0] in '<>!=@' else '<' + fmt)
+            self._structs[fmt] = st
+        values = st.unpack_from(self.data, self.offset)
+        self.offset += st.size
+        return values
+    
+    def getArray(self, typecode: str, count: int) -> array:
+        """Read count values of an array typecode in a single call"""
+        values = array(typecode)
+        values.frombytes(self.getRawView(count * values.itemsize))
+        if BIG_ENDIAN:
+            values.byteswap()
+        return values
+    
+    def getFloats(self, count: int) -> array:
+        return self.getArray('f', count)
+    
+    def getInt16s(self, count: int) -> array:
+        return self.getArray('h', count)
+    
+    def getUint16s(self, count: int) -> array:
+        return self.getArray('H', count)
+    
+    def getUint32s(self, count: int) -> array:
+        return self.getArray('I', count)
+    
+    def getRawView(self, length: int) -> memoryview:
+        """Zero-copy slice of the underlying data"""
+        if self.offset + length > len(self.data):
+            raise IndexError("Read past the end of the data")
+        view = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return view
     
     def getRaw(self, length: int) -> bytearray:
-        bytes = bytearray()
-        for _ in range(length):
-            bytes.append(self.getByte())
-        return bytes
+        return bytearray(self.getRawView(length))
     
     def getString(self, length: int) -> str:
-        return self.getRaw(length).decode('utf-8')
+        return bytes(self.getRawView(length)).decode('utf-8')
@@ -17,50 +17,77 @@
 
 import struct
 
+from io_simgeom.util.bytereader import INT16, UINT16, INT32, UINT32, INT64, UINT64, FLOAT
+
+BYTE = struct.Struct('B')
+
 
 class ByteWriter:
+    """
+    Writes little endian values with struct.pack_into at a cursor.
+    Passing the final size up front allocates the whole buffer once, it grows when written past.
+    """
 
-    def __init__(self):
-        # All GEOM Files will start with this
-        self.data = bytearray(b'\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+    def __init__(self, size: int = 0, header: bool = True):
+        # All GEOM Files will start with this, sections written after the start of a file skip it
+        header = b'\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00' if header else b''
+        self.data = bytearray(max(size, len(header)))
+        self.data[0:len(header)] = header
+        self.offset = len(header)
     
     def getData(self) -> bytearray:
+        if self.offset < len(self.data):
+            del self.data[self.offset:]
         return self.data
     
     def getLength(self) -> int:
-        return len(self.data)
+        return self.offset
+    
+    def reserve(self, length: int) -> int:
+        """Claim length bytes to be filled in directly through self.data, returns their offset"""
+        start = self.offset
+        self.offset += length
+        if self.offset > len(self.data):
+            self.data.extend(bytes(self.offset - len(self.data)))
+        return start
+    
+    def _pack(self, st: struct.Struct, val):
+        st.pack_into(self.data, self.reserve(st.size), val)
     
     def replaceAt(self, offset: int, datatype: str, val):
-        newdata = struct.pack('<'+datatype, val)
-        for i, b in enumerate(newdata):
-            self.data[offset+i] = b
+        struct.pack_into('<'+datatype, self.data, offset, val)
     
     def setByte(self, val: int):
-        self.data += struct.pack('B', val)
+        self._pack(BYTE, val)
     
     def setArbitrary(self, datatype: str, val):
-        self.data += struct.pack('<'+datatype, val)
+        fmt = '<'+datatype
+        struct.pack_into(fmt, self.data, self.reserve(struct.calcsize(fmt)), val)
     
     def setInt16(self, val: int):
-        self.data += struct.pack('<h', val)
+        self._pack(INT16, val)
     
     def setUInt16(self, val: int):
-        self.data += struct.pack('<H', val)
+        self._pack(UINT16, val)
     
     def setInt32(self, val: int):
-        self.data += struct.pack('<i', val)
+        self._pack(INT32, val)
     
     def setUInt32(self, val: int):
-        self.data += struct.pack('<I', val)
+        self._pack(UINT32, val)
     
     def setInt64(self, val: int):
-        self.data += struct.pack('<q', val)
+        self._pack(INT64, val)
     
     def setUInt64(self, val: int):
-        self.data += struct.pack('<Q', val)
+        self._pack(UINT64, val)
     
     def setFloat(self, val: float):
-        self.data += struct.pack('<f', val)
+        self._pack(FLOAT, val)
+    
+    def setBytes(self, val):
+        start = self.reserve(len(val))
+        self.data[start:self.offset] = val
     
     def setIdentifier(self, val: str):
-        self.data += val.encode("utf-8")
+        self.setBytes(val.encode("utf-8"))
@@ -0,0 +1,76 @@
+# Copyright (C) 2019 SmugTomato
+# 
+# This file is part of BlenderGeom.
+# 
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    Lock on a lock file shared between processes, used as a context manager.
+    When the lock file can't be created, e.g. in a read-only install, locking is skipped
+    unless required is set.
+
+    shared takes a read lock that other readers can hold at the same time. Readers never create
+    the lock file, without one nobody has written yet and locking is skipped. msvcrt only has
+    exclusive locks, so on Windows readers wait for each other too.
+    """
+
+    def __init__(self, path: str, required: bool = False, shared: bool = False):
+        self.path = path
+        self.required = required
+        self.shared = shared
+        self.file = None
+    
+    def __enter__(self) -> 'FileLock':
+        try:
+            self.file = open(self.path, 'rb' if self.shared else 'a+b')
+        except OSError:
+            if self.required and not self.shared:
+                raise
+            return self
+
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            # LK_LOCK gives up after 10 attempts, keep trying until the other process is done
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        return self
+    
+    def __exit__(self, *exc):
+        if self.file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
@@ -15,33 +15,40 @@
 # You should have received a copy of the GNU General Public License
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
-import ctypes
+from functools import lru_cache
+from typing import Iterable, List
 
 PRIME32 = 0x01000193
 PRIME64 = 0x00000100000001B3
 OFFSET32 = 0x811C9DC5
 OFFSET64 = 0xCBF29CE484222325
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
 
 def to_uint32(n: int) -> int:
-    return ctypes.c_uint32(n).value
+    return n & MASK32
 
 def to_uint64(n: int) -> int:
-    return ctypes.c_uint64(n).value
+    return n & MASK64
 
 
+@lru_cache(maxsize=8192)
 def fnv32(string: str) -> int:
-    bstring = bytes(string.lower(), 'utf-8')
     fnv_hash = OFFSET32
-    for b in bstring:
-        fnv_hash = (fnv_hash * PRIME32) & 0xffffffff
+    for b in string.lower().encode('utf-8'):
+        fnv_hash = (fnv_hash * PRIME32) & MASK32
         fnv_hash ^= b
-    return to_uint32(fnv_hash)
+    return fnv_hash
 
 
+def fnv32_many(strings: Iterable[str]) -> List[int]:
+    return [fnv32(s) for s in strings]
+
+
+@lru_cache(maxsize=8192)
 def fnv64(string: str) -> int:
-    bstring = bytes(string.lower(), 'utf-8')
     fnv_hash = OFFSET64
-    for b in bstring:
-        fnv_hash = (fnv_hash * PRIME64) & 0xffffffffffffffff
+    for b in string.lower().encode('utf-8'):
+        fnv_hash = (fnv_hash * PRIME64) & MASK64
         fnv_hash ^= b
-    return to_uint64(fnv_hash)
+    return fnv_hash
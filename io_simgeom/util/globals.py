@@ -15,9 +15,11 @@
 # You should have received a copy of the GNU General Public License
 # along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
 import os
 
+from io_simgeom.util.hashdb     import HashDatabase
+from io_simgeom.util.hashindex  import HashIndex
+
 class Globals:
     # Shader Paramater Datatypes
     FLOAT = 1
@@ -32,49 +34,52 @@ class Globals:
         "accessory": 40000
     }
 
-    HASHMAP: dict
+    # Loaded on first use, see get_hash_index()
+    HASH_INDEX: HashIndex = None
     SEAM_FIX: dict = {}
 
-    OUTDATED: int
-    ROOTDIR: str
+    # Set by the update checker in the background, see util.updater
+    OUTDATED: int = 0
+    ROOTDIR: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 
     @staticmethod
-    def init(rootdir: str, outdated: int):
-        Globals.OUTDATED = outdated
+    def init(rootdir: str, outdated: int = None):
         Globals.ROOTDIR = rootdir
-        datadir = f'{rootdir}/data/json'
-        with open(f'{datadir}/fnv_hashmap.json', 'r') as data:
-            Globals.HASHMAP = json.loads(data.read())
-        # for i in range(3):
-        #     with open(f'{datadir}/seams_LOD{i+1}.json', "r") as data:
-        #         Globals.SEAM_FIX[f'LOD{i+1}'] = json.loads(data.read())
+        if outdated is not None:
+            Globals.OUTDATED = outdated
+    
+    @staticmethod
+    def get_database() -> HashDatabase:
+        return HashDatabase(f'{Globals.ROOTDIR}/data/json')
+    
+    @staticmethod
+    def get_hash_index() -> HashIndex:
+        """Binary index of the hash database, cached next to fnv_hashmap.json as fnv_hashmap.bin"""
+        if Globals.HASH_INDEX is None:
+            Globals.HASH_INDEX = Globals.get_database().loadIndex()
+        return Globals.HASH_INDEX
     
     @staticmethod
     def get_bone_name(fnv32hash: int) -> str:
-        hex_fnv = hex(fnv32hash)
-        return Globals.HASHMAP['bones'].get(hex_fnv, hex_fnv)
+        name = Globals.get_hash_index().getName('bones', fnv32hash)
+        return name if name is not None else hex(fnv32hash)
     
     @staticmethod
     def get_shader_name(fnv32hash: int) -> str:
-        hex_fnv = hex(fnv32hash)
-        return Globals.HASHMAP['shader'].get(hex_fnv, hex_fnv)
+        name = Globals.get_hash_index().getName('shader', fnv32hash)
+        return name if name is not None else hex(fnv32hash)
+    
+    @staticmethod
+    def get_bone_hash(name: str) -> int:
+        """Reverse lookup, None for bone names that are not in the database"""
+        return Globals.get_hash_index().getHash('bones', name)
     
     @staticmethod
     def padded_hex(value: int, numbytes: int) -> str:
         return "0x{0:0{1}X}".format(value, numbytes * 2)
     
     @staticmethod
-    def rebuild_fnv_database(bones: dict):
-        path = f'{Globals.ROOTDIR}/data/json/fnv_hashmap.json'
-        data_dict: dict
-        if os.path.exists(f'{path}.backup'):
-            os.remove(f'{path}.backup')
-        os.rename(path, f'{path}.backup')
-        with open(f'{path}.backup', 'r') as data:
-            data_dict = json.load(data)
-            for k, v in bones.items():
-                data_dict['bones'][k] = v
-        with open(f'{path}', 'w') as data:
-            data.write( json.dumps(data_dict, indent=4) )
-            Globals.HASHMAP = data_dict
-            os.remove(f'{path}.backup')
+    def rebuild_fnv_database(bones: dict) -> int:
+        """Add {'0xhash': name} bone entries to the database, returns how many were new"""
+        entries = { int(k, 16): v for k, v in bones.items() }
+        return Globals.get_database().add('bones', entries, Globals.HASH_INDEX)
@@ -0,0 +1,140 @@
+# Copyright (C) 2019 SmugTomato
+# 
+# This file is part of BlenderGeom.
+# 
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+
+from io_simgeom.util.filelock   import FileLock
+from io_simgeom.util.hashindex  import HashIndex
+
+
+class HashDatabase:
+    """
+    The fnv hash database, fnv_hashmap.json plus an append-only journal of entries added since.
+
+    New entries are appended to the journal as JSON lines under an exclusive file lock, so concurrent
+    Blender instances and batch workers can add entries without rewriting the whole database.
+    Loading takes a shared lock and merges the journal over the (cached binary index of the) JSON file, compacting
+    folds the journal back into the JSON file with an atomic replace.
+    """
+
+    # Fold the journal into the JSON file once it grows past this many bytes
+    COMPACT_SIZE = 64 * 1024
+
+
+    def __init__(self, datadir: str):
+        self.json_path      = f'{datadir}/fnv_hashmap.json'
+        self.sidecar_path   = f'{datadir}/fnv_hashmap.bin'
+        self.journal_path   = f'{datadir}/fnv_hashmap.journal'
+        self.lock_path      = f'{datadir}/fnv_hashmap.lock'
+    
+
+    def readJournal(self) -> dict:
+        """{section: {hash: name}} of all journal entries, later entries win"""
+        entries = {}
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return entries
+
+        for line in lines:
+            try:
+                section, key, name = json.loads(line)
+                entries.setdefault(section, {})[int(key, 16)] = name
+            except (ValueError, TypeError):
+                # Partially written line from a process that was killed mid append
+                continue
+        return entries
+    
+
+    def loadIndex(self) -> HashIndex:
+        with FileLock(self.lock_path, shared=True):
+            index = HashIndex.load(self.json_path, self.sidecar_path)
+            journal = self.readJournal()
+        for section, entries in journal.items():
+            index.merge(section, entries)
+        return index
+    
+
+    def loadDict(self) -> dict:
+        """The whole database in the fnv_hashmap.json layout, {section: {'0xhash': name}}"""
+        with FileLock(self.lock_path, shared=True):
+            with open(self.json_path, 'r') as f:
+                data = json.load(f)
+            journal = self.readJournal()
+        for section, entries in journal.items():
+            target = data.setdefault(section, {})
+            for key, name in entries.items():
+                target[hex(key)] = name
+        return data
+    
+
+    def add(self, section: str, entries: dict, index: HashIndex = None) -> int:
+        """
+        Append {hash: name} entries that are not in the database yet, returns how many were added.
+        index, when given, is the caller's loaded index and is updated in place.
+        """
+        with FileLock(self.lock_path):
+            current = HashIndex.load(self.json_path, self.sidecar_path)
+            for journal_section, journal_entries in self.readJournal().items():
+                current.merge(journal_section, journal_entries)
+
+            new = {}
+            for key, name in entries.items():
+                if current.getName(section, key) != name:
+                    new[key] = name
+
+            if new:
+                lines = ''.join( json.dumps([section, hex(key), name]) + '\n' for key, name in new.items() )
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > HashDatabase.COMPACT_SIZE:
+                self._compact()
+
+        if index is not None and new:
+            index.merge(section, new)
+        return len(new)
+    
+
+    def compact(self):
+        with FileLock(self.lock_path):
+            self._compact()
+    
+
+    def _compact(self):
+        """Fold the journal into the JSON file, the lock has to be held"""
+        journal = self.readJournal()
+        if not journal:
+            return
+
+        with open(self.json_path, 'r') as f:
+            data = json.load(f)
+        for section, entries in journal.items():
+            target = data.setdefault(section, {})
+            for key, name in entries.items():
+                target[hex(key)] = name
+
+        with open(f'{self.json_path}.tmp', 'w') as f:
+            f.write( json.dumps(data, indent=4) )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{self.json_path}.tmp', self.json_path)
+        os.remove(self.journal_path)
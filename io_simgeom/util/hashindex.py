@@ -0,0 +1,196 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import struct
+import tempfile
+
+from array      import array
+from bisect     import bisect_left
+
+from io_simgeom.util.bytereader     import ByteReader, BIG_ENDIAN
+from io_simgeom.util.bytewriter     import ByteWriter
+
+"""
+Binary sidecar layout, all little endian:
+    'FNVI', version, source size, source mtime (ns, uint64), section count
+    per section:
+        name length, name, entry count,
+        sorted uint32 hashes, uint32 name offsets (count + 1), name table length, utf-8 name table
+"""
+MAGIC = "FNVI"
+VERSION = 1
+
+
+class HashIndex:
+    """
+    Integer keyed fnv32 hash -> name lookups per hashmap section ('bones', 'shader', ...).
+    Hashes are kept as a sorted array searched with bisect, names in a single string table.
+    """
+
+
+    def __init__(self):
+        self.sections:  dict = {}   # section -> (hashes, offsets, names)
+        self._reverse:  dict = {}   # section -> {name: hash}, built on first use
+
+
+    @staticmethod
+    def fromDict(hashmap: dict) -> 'HashIndex':
+        """Build from the fnv_hashmap.json layout, {section: {'0xhash': name}}"""
+        index = HashIndex()
+        for section, entries in hashmap.items():
+            items = sorted( (int(key, 16), name) for key, name in entries.items() )
+            index.addSection(section, [h for h, _ in items], [name for _, name in items])
+        return index
+
+
+    def addSection(self, section: str, hashes: list, names: list):
+        """hashes has to be sorted ascending"""
+        offsets = array('I', [0])
+        table = bytearray()
+        for name in names:
+            table += name.encode('utf-8')
+            offsets.append(len(table))
+        self.sections[section] = (array('I', hashes), offsets, bytes(table))
+        self._reverse.pop(section, None)
+
+
+    def merge(self, section: str, entries: dict):
+        """Add or replace {hash: name} entries of a section"""
+        merged = dict( self.items(section) )
+        merged.update(entries)
+        hashes = sorted(merged)
+        self.addSection(section, hashes, [merged[h] for h in hashes])
+
+
+    def getName(self, section: str, fnv32hash: int) -> str:
+        """Name for a hash, None when it is unknown"""
+        entry = self.sections.get(section)
+        if entry is None:
+            return None
+        hashes, offsets, names = entry
+        i = bisect_left(hashes, fnv32hash)
+        if i == len(hashes) or hashes[i] != fnv32hash:
+            return None
+        return names[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+
+    def getHash(self, section: str, name: str) -> int:
+        """Hash for a known name, None when it is unknown"""
+        reverse = self._reverse.get(section)
+        if reverse is None:
+            reverse = dict( (name, h) for h, name in self.items(section) )
+            self._reverse[section] = reverse
+        return reverse.get(name)
+
+
+    def items(self, section: str):
+        """(hash, name) pairs of a section in hash order"""
+        entry = self.sections.get(section)
+        if entry is None:
+            return
+        hashes, offsets, names = entry
+        for i, h in enumerate(hashes):
+            yield h, names[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+
+    def toBytes(self, source_size: int = 0, source_mtime: int = 0) -> bytearray:
+        b = ByteWriter(header=False)
+        b.setIdentifier(MAGIC)
+        b.setUInt32(VERSION)
+        b.setUInt32(source_size)
+        b.setUInt64(source_mtime)
+        b.setUInt32(len(self.sections))
+        for section, (hashes, offsets, names) in self.sections.items():
+            encoded = section.encode('utf-8')
+            b.setUInt32(len(encoded))
+            b.setBytes(encoded)
+            b.setUInt32(len(hashes))
+            for values in (hashes, offsets):
+                if BIG_ENDIAN:
+                    values = array('I', values)
+                    values.byteswap()
+                b.setBytes( memoryview(values).cast('B') )
+            b.setUInt32(len(names))
+            b.setBytes(names)
+        return b.getData()
+
+
+    @staticmethod
+    def fromBytes(data: bytes, source_size: int = None, source_mtime: int = None) -> 'HashIndex':
+        """Parse a sidecar, None when it is invalid or was built from a different source file"""
+        reader = ByteReader(data)
+        try:
+            if reader.getString(4) != MAGIC or reader.getUint32() != VERSION:
+                return None
+            size = reader.getUint32()
+            mtime = reader.getUint64()
+            if source_size is not None and (size, mtime) != (source_size, source_mtime):
+                return None
+
+            index = HashIndex()
+            for _ in range(reader.getUint32()):
+                section = reader.getString( reader.getUint32() )
+                count = reader.getUint32()
+                hashes = reader.getUint32s(count)
+                offsets = reader.getUint32s(count + 1)
+                names = bytes( reader.getRawView(reader.getUint32()) )
+                index.sections[section] = (hashes, offsets, names)
+            return index
+        except (IndexError, UnicodeDecodeError, ValueError, struct.error):
+            return None
+
+
+    @staticmethod
+    def load(json_path: str, sidecar_path: str) -> 'HashIndex':
+        """Load the sidecar, (re)building it from the JSON file when it is missing or out of date"""
+        stat = os.stat(json_path)
+        source_size = stat.st_size & 0xFFFFFFFF
+        source_mtime = stat.st_mtime_ns & 0xFFFFFFFFFFFFFFFF
+
+        try:
+            with open(sidecar_path, 'rb') as f:
+                index = HashIndex.fromBytes(f.read(), source_size, source_mtime)
+            if index is not None:
+                return index
+        except OSError:
+            pass
+
+        with open(json_path, 'r') as f:
+            index = HashIndex.fromDict( json.load(f) )
+
+        # The data directory may not be writable, the index will just be rebuilt next time.
+        # Every process writes its own temp file, a shared one could be truncated before it is replaced
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(sidecar_path) or '.',
+                prefix=os.path.basename(sidecar_path) + '.',
+                suffix='.tmp'
+            )
+            with os.fdopen(fd, 'wb') as f:
+                f.write( index.toBytes(source_size, source_mtime) )
+            os.replace(tmp_path, sidecar_path)
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        return index
@@ -0,0 +1,197 @@
+# Copyright (C) 2019 SmugTomato
+# 
+# This file is part of BlenderGeom.
+# 
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+# Helpers to fill Blender meshes from packed GEOM data using foreach_set
+
+import zlib
+
+import bpy
+import numpy as np
+
+from array      import array
+from contextlib import contextmanager
+
+from io_simgeom.models.face import FaceBuffer
+
+
+def to_blender_axes(values) -> np.ndarray:
+    """GEOM (x, y, z) vectors to Blender (x, -z, y), as an (N,3) float32 array"""
+    values = np.asarray(values, dtype=np.float32).reshape(-1, 3)
+    return np.column_stack( (values[:, 0], -values[:, 2], values[:, 1]) )
+
+
+def vertex_positions(mesh) -> np.ndarray:
+    """Flat Blender space vertex coordinates"""
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    return coords
+
+
+def vertex_normals(mesh) -> np.ndarray:
+    """Flat per vertex split normals, a vertex takes the normal of the last loop using it"""
+    mesh.calc_normals_split()
+    loop_normals = np.empty(len(mesh.loops) * 3, dtype=np.float32)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('normal', loop_normals)
+    mesh.loops.foreach_get('vertex_index', loop_vertices)
+
+    normals = np.zeros( (len(mesh.vertices), 3), dtype=np.float32 )
+    normals[loop_vertices] = loop_normals.reshape(-1, 3)
+    return normals.reshape(-1)
+
+
+def add_vertices(mesh, coords):
+    """Add vertices from Blender space coordinates, flat or (N,3)"""
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1)
+    mesh.vertices.add(len(coords) // 3)
+    mesh.vertices.foreach_set('co', coords)
+
+
+def add_triangles(mesh, faces: FaceBuffer):
+    """Add all triangles of a FaceBuffer to a mesh, the loop order matches from_pydata"""
+    indices = np.asarray(faces.indices, dtype=np.int32)
+    count = len(indices) // 3
+
+    mesh.loops.add(count * 3)
+    mesh.polygons.add(count)
+    mesh.loops.foreach_set('vertex_index', indices)
+    mesh.polygons.foreach_set('loop_start', np.arange(0, count * 3, 3, dtype=np.int32))
+    # Polygon sizes follow from the loop starts since 3.6, where loop_total became read-only
+    if bpy.app.version < (3, 6, 0):
+        mesh.polygons.foreach_set('loop_total', np.full(count, 3, dtype=np.int32))
+    # Out of range indices or degenerate triangles from a damaged file would otherwise end up in the mesh
+    mesh.validate()
+    mesh.update(calc_edges=True)
+
+
+def set_smooth(mesh, smooth: bool = True):
+    mesh.polygons.foreach_set('use_smooth', np.full(len(mesh.polygons), smooth, dtype=bool))
+
+
+def loop_vertices(mesh) -> np.ndarray:
+    """Vertex index of every loop, follows the mesh rather than the GEOM index buffer after validate()"""
+    indices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', indices)
+    return indices
+
+
+def add_uv_layer(mesh, name: str, uv):
+    """Add a UV layer from flat per vertex GEOM coordinates, V is flipped to Blender's convention"""
+    loop_uv = np.asarray(uv, dtype=np.float32).reshape(-1, 2)[ loop_vertices(mesh) ]
+    loop_uv[:, 1] = 1.0 - loop_uv[:, 1]
+    layer = mesh.uv_layers.new(name=name)
+    layer.data.foreach_set('uv', loop_uv.ravel())
+    return layer
+
+
+def add_vertex_colors(mesh, name: str, colors):
+    """Add a vertex color layer from flat per vertex RGBA bytes"""
+    loop_colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4)[ loop_vertices(mesh) ]
+    loop_colors /= 255
+    layer = mesh.vertex_colors.new(name=name, do_init=False)
+    layer.data.foreach_set('color', loop_colors.ravel())
+    return layer
+
+
+def morph_shape_keys(ob) -> list:
+    """Shape keys of an object that hold GEOM morphs, the ones named MORPH_*"""
+    keys = ob.data.shape_keys
+    if keys is None:
+        return []
+    return [ key for key in keys.key_blocks if key != keys.reference_key and key.name.startswith("MORPH_") ]
+
+
+def shape_key_positions(key) -> np.ndarray:
+    coords = np.empty(len(key.data) * 3, dtype=np.float32)
+    key.data.foreach_get('co', coords)
+    return coords
+
+
+def shape_key_normals(key) -> np.ndarray:
+    """Flat vertex normals of the mesh deformed by the key"""
+    return np.asarray(key.normals_vertex_get(), dtype=np.float32)
+
+
+def set_shape_key(ob, name: str, coords):
+    """Create or overwrite a shape key from Blender space coordinates, adds a basis key when there is none"""
+    if ob.data.shape_keys is None:
+        ob.shape_key_add(name="Basis", from_mix=False)
+    key = ob.data.shape_keys.key_blocks.get(name)
+    if key is None:
+        key = ob.shape_key_add(name=name, from_mix=False)
+    key.data.foreach_set('co', np.asarray(coords, dtype=np.float32).reshape(-1))
+    return key
+
+
+def shape_key_fingerprint(key) -> str:
+    """CRC of the coordinates of a shape key, changes whenever the key is edited"""
+    return hex( zlib.crc32( shape_key_positions(key).tobytes() ) )
+
+
+def set_shape_key_normals(ob, key, deltas):
+    """
+    Keep the GEOM space normal offsets of a morph shape key in ob['morph_normals'][key.name],
+    shape keys themselves can't hold the custom normals the offsets are relative to.
+    They are stored with the fingerprint of the key so edits to the key can be detected.
+    """
+    packed = array('f')
+    packed.frombytes( np.asarray(deltas, dtype=np.float32).reshape(-1).tobytes() )
+    if 'morph_normals' not in ob:
+        ob['morph_normals'] = {}
+    ob['morph_normals'][key.name] = {
+        'fingerprint':  shape_key_fingerprint(key),
+        'normals':      packed
+    }
+
+
+def get_shape_key_normals(ob, key) -> np.ndarray:
+    """
+    Stored GEOM space normal offsets of a morph shape key, None when there are none or the key was edited since.
+    Renamed keys are found by their fingerprint.
+    """
+    stored = ob.get('morph_normals')
+    if not stored:
+        return None
+
+    fingerprint = shape_key_fingerprint(key)
+    entry = stored.get(key.name)
+    if entry is None or entry.get('fingerprint') != fingerprint:
+        entry = next( (entry for entry in stored.values() if entry.get('fingerprint') == fingerprint), None )
+    if entry is None or len(entry['normals']) != len(key.data) * 3:
+        return None
+    return np.array(entry['normals'].to_list(), dtype=np.float32)
+
+
+@contextmanager
+def shape_keys_muted(ob):
+    """Mute every shape key but the basis for the duration of the block, evaluating the object then gives the base mesh"""
+    keys = ob.data.shape_keys
+    if keys is None:
+        yield
+        return
+
+    muted = [ (key, key.mute) for key in keys.key_blocks if key != keys.reference_key ]
+    show_only = ob.show_only_shape_key
+    for key, _ in muted:
+        key.mute = True
+    ob.show_only_shape_key = False
+    try:
+        yield
+    finally:
+        for key, mute in muted:
+            key.mute = mute
+        ob.show_only_shape_key = show_only
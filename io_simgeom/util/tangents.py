@@ -0,0 +1,107 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+# Per vertex tangents for normal mapping, computed from flat position, uv and index arrays
+# http://www.opengl-tutorial.org/intermediate-tutorials/tutorial-13-normal-mapping/
+
+import math
+
+from array  import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Used for vertices whose face tangents cancel out or that aren't part of any face
+FALLBACK_TANGENT = (1.0, 0.0, 0.0)
+
+
+def calc_tangents(positions, uvs, indices):
+    """
+    Average of the normalized face tangents around every vertex, as a flat xyz array.
+    Only the sign of the UV determinant matters once a face tangent is normalized,
+    so triangles with a degenerate UV mapping use their unscaled tangent.
+    """
+    if np is None:
+        return _calc_tangents_list(positions, uvs, indices)
+
+    pos = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    uv = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+
+    delta_pos1 = pos[tris[:, 1]] - pos[tris[:, 0]]
+    delta_pos2 = pos[tris[:, 2]] - pos[tris[:, 0]]
+    delta_uv1 = uv[tris[:, 1]] - uv[tris[:, 0]]
+    delta_uv2 = uv[tris[:, 2]] - uv[tris[:, 0]]
+
+    det = delta_uv1[:, 0] * delta_uv2[:, 1] - delta_uv1[:, 1] * delta_uv2[:, 0]
+    sign = np.where(det < 0, -1.0, 1.0)
+    face_tangents = (delta_pos1 * delta_uv2[:, 1:2] - delta_pos2 * delta_uv1[:, 1:2]) * sign[:, None]
+    _normalize(face_tangents)
+
+    # Scatter-add every face tangent onto its three corners
+    corners = tris.reshape(-1)
+    tangents = np.empty_like(pos)
+    for axis in range(3):
+        tangents[:, axis] = np.bincount(corners, weights=np.repeat(face_tangents[:, axis], 3), minlength=len(pos))
+
+    unset = ~_normalize(tangents)
+    tangents[unset] = FALLBACK_TANGENT
+    return tangents.astype(np.float32).reshape(-1)
+
+
+def _normalize(vectors) -> 'np.ndarray':
+    """Normalize (N,3) rows in place, returns the mask of rows that had a length"""
+    lengths = np.sqrt( np.einsum('ij,ij->i', vectors, vectors) )
+    valid = lengths > 0
+    vectors[valid] /= lengths[valid, None]
+    vectors[~valid] = 0
+    return valid
+
+
+def _calc_tangents_list(positions, uvs, indices):
+    count = len(positions) // 3
+    sums = [0.0] * (count * 3)
+
+    for f in range(0, len(indices) - len(indices) % 3, 3):
+        a, b, c = indices[f], indices[f + 1], indices[f + 2]
+        delta_pos1 = [positions[3*b + k] - positions[3*a + k] for k in range(3)]
+        delta_pos2 = [positions[3*c + k] - positions[3*a + k] for k in range(3)]
+        delta_uv1 = (uvs[2*b] - uvs[2*a], uvs[2*b + 1] - uvs[2*a + 1])
+        delta_uv2 = (uvs[2*c] - uvs[2*a], uvs[2*c + 1] - uvs[2*a + 1])
+
+        det = delta_uv1[0] * delta_uv2[1] - delta_uv1[1] * delta_uv2[0]
+        sign = -1.0 if det < 0 else 1.0
+        tangent = [(delta_pos1[k] * delta_uv2[1] - delta_pos2[k] * delta_uv1[1]) * sign for k in range(3)]
+        length = math.sqrt( sum(t * t for t in tangent) )
+        if length == 0:
+            continue
+        for v in (a, b, c):
+            for k in range(3):
+                sums[3*v + k] += tangent[k] / length
+
+    tangents = array('f')
+    for v in range(count):
+        x, y, z = sums[3*v:3*v + 3]
+        length = math.sqrt(x*x + y*y + z*z)
+        if length == 0:
+            tangents.extend(FALLBACK_TANGENT)
+        else:
+            tangents.extend( (x / length, y / length, z / length) )
+    return tangents
@@ -0,0 +1,127 @@
+# Copyright (C) 2019 SmugTomato
+# 
+# This file is part of BlenderGeom.
+# 
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from io_simgeom.util.globals import Globals
+
+CHECK_FAILED = -1
+CHECK_UPDATED = 0
+CHECK_OUTDATED = 1
+
+RELEASES_URL = "https://api.github.com/repos/SmugTomato/blender-sims3-geom/releases/latest"
+
+# How long a check result is reused before asking GitHub again, in seconds
+CACHE_TTL = 24 * 60 * 60
+CACHE_TTL_FAILED = 60 * 60
+
+
+def check_version(local: tuple) -> int:
+    """Compare the latest GitHub release against the local version, blocks for up to 2 seconds"""
+    # urllib is slow to import, only pay for it when actually checking
+    from urllib.request import urlopen, Request
+    from urllib.error import URLError
+
+    http_request = Request(RELEASES_URL, headers={"Accept": "application/json"})
+    tag = None
+
+    try:
+        with urlopen(http_request, timeout=2) as response:
+            if response.status != 200:
+                return CHECK_FAILED
+            
+            s = response.read().decode()
+            data = json.loads(s)
+            
+            tag = data.get('tag_name')
+        
+        if tag == None:
+            return CHECK_FAILED
+
+        tag = tag.replace('v', '').split('.')
+        tag = [int(i) for i in tag]
+
+        for i in range(3):
+            if tag[i] > local[i]:
+                return CHECK_OUTDATED
+    except (URLError, OSError, ValueError) as err:
+        print(err)
+        return CHECK_FAILED
+    
+    return CHECK_UPDATED
+
+
+def cache_path() -> str:
+    return f'{Globals.ROOTDIR}/data/version_check.json'
+
+
+def read_cache(local: tuple) -> int:
+    """Cached check result, None when there is none for this version or it has expired"""
+    try:
+        with open(cache_path(), 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if cache.get('version') != list(local):
+        return None
+    ttl = CACHE_TTL_FAILED if cache.get('result') == CHECK_FAILED else CACHE_TTL
+    if not 0 <= time.time() - cache.get('checked', 0) < ttl:
+        return None
+    return cache.get('result')
+
+
+def write_cache(local: tuple, result: int):
+    # The add-on directory may not be writable, the check will just run again next time
+    path = cache_path()
+    tmp_path = None
+    try:
+        # Unique temp file, concurrent sessions would truncate a shared one before it is replaced
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': list(local), 'checked': time.time(), 'result': result}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def start_version_check(local: tuple) -> threading.Thread:
+    """
+    Set Globals.OUTDATED from the cache, or check in a background thread when the cache is stale.
+    Returns the thread, None when the cached result was used.
+    """
+    cached = read_cache(local)
+    if cached is not None:
+        Globals.OUTDATED = cached
+        return None
+
+    def run():
+        result = check_version(local)
+        Globals.OUTDATED = result
+        write_cache(local, result)
+
+    thread = threading.Thread(target=run, name="simgeom_version_check", daemon=True)
+    thread.start()
+    return thread
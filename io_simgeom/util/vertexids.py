@@ -0,0 +1,146 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+# Groups coincident vertices so they can share a GEOM vertex ID, and stores the IDs on objects
+#
+# Objects keep one int per vertex in ob['vertex_ids'], NO_ID for vertices without one,
+# and the number of distinct IDs in ob['vertex_id_count'].
+# Older files have ob['vert_ids'] instead, {hexed vertex ID: [vertex indices]}
+
+import math
+
+from array  import array
+
+
+NO_ID = -1
+NEIGHBOUR_CELLS = [ (x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1) ]
+
+
+def cluster_positions(positions, margin: float = 0.0) -> list:
+    """
+    Group vertex indices whose flat xyz positions lie within margin of each other, chains included.
+    Uses a grid hash with margin sized cells, each vertex only has to be compared to the 27 cells around it.
+    Groups are ordered by their lowest vertex index.
+    """
+    count = len(positions) // 3
+    coords = [ tuple(positions[3*i:3*i + 3]) for i in range(count) ]
+
+    if margin <= 0:
+        exact = {}
+        for i, co in enumerate(coords):
+            exact.setdefault(co, []).append(i)
+        return list( exact.values() )
+
+    parent = list( range(count) )
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    limit = margin * margin
+    grid = {}
+    for i, (x, y, z) in enumerate(coords):
+        cell = ( math.floor(x / margin), math.floor(y / margin), math.floor(z / margin) )
+        for dx, dy, dz in NEIGHBOUR_CELLS:
+            for j in grid.get( (cell[0] + dx, cell[1] + dy, cell[2] + dz), () ):
+                ox, oy, oz = coords[j]
+                if (x - ox)**2 + (y - oy)**2 + (z - oz)**2 > limit:
+                    continue
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        grid.setdefault(cell, []).append(i)
+
+    groups = {}
+    for i in range(count):
+        groups.setdefault(find(i), []).append(i)
+    return list( groups.values() )
+
+
+def calc_vertex_ids(positions, margin: float, start_id: int) -> array:
+    """Vertex ID per vertex, numbered from start_id in the order of cluster_positions"""
+    vertex_ids = array('i', [NO_ID]) * (len(positions) // 3)
+    for i, indices in enumerate( cluster_positions(positions, margin) ):
+        for index in indices:
+            vertex_ids[index] = start_id + i
+    return vertex_ids
+
+
+def ids_from_map(vert_ids: dict, vertex_count: int) -> array:
+    """Legacy {hexed ID: [indices]} mapping to one ID per vertex"""
+    vertex_ids = array('i', [NO_ID]) * vertex_count
+    for key, indices in vert_ids.items():
+        vertex_id = int(key, 0)
+        for index in indices:
+            vertex_ids[index] = vertex_id
+    return vertex_ids
+
+
+def ids_to_map(vertex_ids) -> dict:
+    """One ID per vertex to the legacy {hexed ID: [indices]} mapping"""
+    vert_ids = {}
+    for index, vertex_id in enumerate(vertex_ids):
+        if vertex_id != NO_ID:
+            vert_ids.setdefault(hex(vertex_id), []).append(index)
+    return vert_ids
+
+
+def count_unique(vertex_ids) -> int:
+    if vertex_ids is None:
+        return 0
+    unique = set(vertex_ids)
+    unique.discard(NO_ID)
+    return len(unique)
+
+
+def get_vertex_ids(ob) -> array:
+    """Vertex IDs of a mesh object, converting the legacy mapping when needed, None when there are none"""
+    vertex_ids = ob.get('vertex_ids')
+    if vertex_ids is not None:
+        return array('i', vertex_ids)
+    vert_ids = ob.get('vert_ids')
+    if vert_ids:
+        return ids_from_map(vert_ids, len(ob.data.vertices))
+    return None
+
+
+def get_unique_count(ob) -> int:
+    """Number of distinct vertex IDs, cached by set_vertex_ids so the UI doesn't scan every vertex"""
+    count = ob.get('vertex_id_count')
+    if count is not None:
+        return count
+    return len( ob.get('vert_ids') or {} )
+
+
+def set_vertex_ids(ob, vertex_ids):
+    ob['vertex_ids'] = vertex_ids
+    ob['vertex_id_count'] = count_unique(vertex_ids)
+    clear_legacy_ids(ob)
+
+
+def clear_vertex_ids(ob):
+    for key in ('vertex_ids', 'vertex_id_count'):
+        if key in ob:
+            del ob[key]
+    clear_legacy_ids(ob)
+
+
+def clear_legacy_ids(ob):
+    if 'vert_ids' in ob:
+        del ob['vert_ids']
@@ -0,0 +1,79 @@
+# Copyright (C) 2019 SmugTomato
+#
+# This file is part of BlenderGeom.
+#
+# BlenderGeom is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# BlenderGeom is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with BlenderGeom.  If not, see <http://www.gnu.org/licenses/>.
+
+# Groups GEOM skin weights per bone so vertex groups can be filled with one call per bucket
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def bucket_weights(assignment, weights, bone_count: int):
+    """
+    Group the 4 influences per vertex into (bone index, weight, [vertex indices]) buckets.
+    Influences with a zero weight are dropped, a vertex using the same bone twice gets the sum.
+    Returns the buckets and the number of assignments that were out of range of the bone list.
+    """
+    if np is None:
+        return _bucket_weights_list(assignment, weights, bone_count)
+
+    bones = np.asarray(assignment, dtype=np.int64).reshape(-1)
+    values = np.asarray(weights, dtype=np.float32).reshape(-1)
+    verts = np.repeat( np.arange(len(bones) // 4, dtype=np.int64), 4 )
+
+    valid = bones < bone_count
+    skipped = int( np.count_nonzero(~valid) )
+    keep = valid & (values > 0)
+    bones, values, verts = bones[keep], values[keep], verts[keep]
+    if len(bones) == 0:
+        return [], skipped
+
+    # Merge duplicate (vertex, bone) influences
+    pairs, inverse = np.unique(verts * bone_count + bones, return_inverse=True)
+    values = np.bincount(inverse.reshape(-1), weights=values).astype(np.float32)
+    verts, bones = pairs // bone_count, pairs % bone_count
+
+    # Sort by bone, then weight, then vertex and split wherever bone or weight changes
+    order = np.lexsort( (verts, values, bones) )
+    bones, values, verts = bones[order], values[order], verts[order]
+    starts = np.flatnonzero( np.r_[True, (bones[1:] != bones[:-1]) | (values[1:] != values[:-1])] )
+    ends = np.r_[starts[1:], len(bones)]
+
+    buckets = [
+        ( int(bones[s]), float(values[s]), verts[s:e].tolist() )
+        for s, e in zip(starts.tolist(), ends.tolist())
+    ]
+    return buckets, skipped
+
+
+def _bucket_weights_list(assignment, weights, bone_count: int):
+    skipped = 0
+    merged = {}
+    for i, (bone, weight) in enumerate( zip(assignment, weights) ):
+        if bone >= bone_count:
+            skipped += 1
+            continue
+        if weight > 0:
+            key = (i // 4, bone)
+            merged[key] = merged.get(key, 0.0) + weight
+
+    grouped = {}
+    for (vert, bone), weight in sorted( merged.items() ):
+        grouped.setdefault( (bone, weight), [] ).append(vert)
+    buckets = [ (bone, weight, verts) for (bone, weight), verts in sorted( grouped.items() ) ]
+    return buckets, skipped